@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0008_newsheadline_abbreviation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsreleasedata',
+            index=models.Index(fields=['headline', 'date'], name='releasedata_headline_date_idx'),
+        ),
+    ]
@@ -20,3 +20,6 @@ class NewsReleaseData(models.Model):
 
     class Meta:
         verbose_name_plural = "News release data"
+        indexes = [
+            models.Index(fields=["headline", "date"], name="releasedata_headline_date_idx"),
+        ]
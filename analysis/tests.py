@@ -1,3 +1,29 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from analysis.utils.metrics import MetricsCalculator
+import numpy as np
+import pandas as pd
+
+
+class AutocorrelationTests(SimpleTestCase):
+    def to_releases(self, size: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            "date": pd.date_range("2020-01-01", periods=size, freq="MS"),
+            "CPI": [float(value % 4) for value in range(size)],
+            "PPI": [float(value) for value in range(size)],
+        })
+
+    def test_empty_date_range(self):
+        autocorrelation = MetricsCalculator(self.to_releases(0)).calc(["autocorrelation"])["autocorrelation"]
+
+        self.assertTrue(autocorrelation.empty)
+        self.assertEqual(autocorrelation.columns.to_list(), ["lag", "CPI", "PPI"])
+
+    def test_lags_are_bounded_by_the_series(self):
+        autocorrelation = MetricsCalculator(self.to_releases(5)).calc(["autocorrelation"])["autocorrelation"]
+
+        self.assertEqual(autocorrelation["lag"].to_list(), [1, 2, 3, 4])
+        values = self.to_releases(5)["CPI"].to_numpy()
+        values = values - values.mean()
+        expected = [round((values[lag:] * values[:-lag]).sum() / (values * values).sum(), 3) for lag in range(1, 5)]
+        self.assertEqual(autocorrelation["CPI"].to_list(), expected)
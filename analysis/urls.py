@@ -6,4 +6,6 @@ from . import views
 urlpatterns = [
     path("product=<product>/sector=<sector>/", views.ChartData.as_view()),
     path("product=<product>/sector=<sector>/period=<startdate>-<enddate>/metric=<metric>", views.TableData.as_view()),
+    path("leadlag/", views.LeadLag.as_view()),
+    path("leadlag/product=<product>/", views.LeadLag.as_view()),
 ]
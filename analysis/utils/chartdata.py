@@ -1,16 +1,33 @@
 from analysis.utils.dboperator import DbController
 from analysis.utils.metrics import MetricsCalculator
 
+import numpy as np
 import pandas as pd
-from functools import reduce
 
 
-def transform_date_format(data: pd.DataFrame) -> list:
+MONTH_NAMES = np.array(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
+
+
+def to_month_key(dates: pd.DatetimeIndex) -> pd.Index:
+    """
+    Gets the integer key year * 12 + month - 1 of every date, so that dates in the same month share a key
+    """
+    return dates.year * 12 + dates.month - 1
+
+
+def bucket_to_month_key(buckets):
     """
-    Formats date strings to m-yy
+    Converts yyyymm buckets of the monthly close table to month keys
     """
-    data["date"] = pd.to_datetime(data["date"], yearfirst=True).apply(lambda date: date.strftime("%b-%y"))
-    return data
+    return buckets // 100 * 12 + buckets % 100 - 1
+
+
+def to_month_label(month_keys: np.ndarray) -> np.ndarray:
+    """
+    Formats month keys to mmm-yy labels, e.g. Jan-24
+    """
+    years = np.char.zfill((month_keys // 12 % 100).astype(str), 2)
+    return np.char.add(np.char.add(MONTH_NAMES[month_keys % 12], "-"), years)
 
 
 class DataMixer:
@@ -21,29 +38,26 @@ class DataMixer:
 
     def _get_news_mixed(self, news_list: list) -> list:
         """
-        Gets a nested dictionary of news data in a given time range
+        Gets the monthly release data of news in a given time range
         Parameters:
             news_list: list
                 The list of news whose release data are to be fetched
         Returns:
             list
-                A list of DataFrames containing data associated with each news given in the parameter
+                A list containing a DataFrame indexed by month key with a column per news given in the parameter,
+                a value is missing if the news has no release in that month
         """
-        dataframes_list = list()
-        for news in news_list:
-            release_data = self.controller.fetch_records("release data", self.start_date,
-                                                         self.end_date, "abbreviation", news)
-            release_data = \
-                pd.DataFrame.from_records(release_data, columns=["date", "value"]) \
-                    .rename(columns={"value": news})
-            release_data = transform_date_format(release_data)
-            dataframes_list.append(release_data)
-
-        return dataframes_list
-
-    def _get_price_mixed(self, product: str, news_list: list) -> dict:
+        release_data = self.controller.fetch_records("release data table", self.start_date,
+                                                     self.end_date, news_list)
+
+        # Keeps the last release of every news in every month
+        release_data = release_data.groupby(to_month_key(release_data.index)).last()
+
+        return [release_data]
+
+    def _get_price_mixed(self, product: str, news_list: list) -> list:
         """
-        Gets a nested dictionary of price records and news data in a given time range
+        Gets the monthly price records and release data of news in a given time range
         Parameters:
             product: str
                 The product whose price records are to be fetched
@@ -51,20 +65,15 @@ class DataMixer:
                 The list of news whose release data are to be fetched
         Returns:
             list
-                A list of DataFrames containing data associated with the product and each news given in the parameter
+                A list containing a Series of the price records of the product and the DataFrame of news,
+                see _get_news_mixed, both indexed by month key
         """
-        dataframes_list = list()
         price_records = self.controller.fetch_records("price record", self.start_date,
                                                       self.end_date, "product", product)
-        price_records = pd.DataFrame.from_records(price_records, columns=["date", product])
-        price_records = transform_date_format(price_records)
-        dataframes_list.append(price_records)
-
-        # Retrieves data associated with each headline and appends them to the list
-        for df in self._get_news_mixed(news_list):
-            dataframes_list.append(df)
+        price_records = pd.DataFrame.from_records(price_records, columns=["bucket", product])
+        price_records = price_records.set_index(bucket_to_month_key(price_records["bucket"]))[product]
 
-        return dataframes_list
+        return [price_records] + self._get_news_mixed(news_list)
 
     def get_mixed_data(self, mix_type: str, *args) -> dict:
         method_dict = {
@@ -72,10 +81,9 @@ class DataMixer:
             "news": self._get_news_mixed,
         }
         dataframes_list = method_dict[mix_type](*args)
-        result = \
-            reduce(
-                lambda left_df, right_df: pd.merge(left_df, right_df, on=["date"], how="inner"),
-                dataframes_list
-            )
+
+        # Aligns every dataset on the months in which all of them have a value, then labels the months
+        result = pd.concat(dataframes_list, axis=1, join="inner").dropna().sort_index()
+        result.insert(0, "date", to_month_label(result.index.to_numpy(dtype=np.int64)))
 
         return result.to_dict(orient="list")
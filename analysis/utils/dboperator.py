@@ -1,7 +1,9 @@
+from contextlib import nullcontext
 import os
 import sqlite3
 import pandas as pd
-from datetime import datetime
+from rankingtable.utils.manifest import IngestManifest, read_new_rows
+from rankingtable.utils.dboperator import parse_dates
 
 
 class DataNormalization:
@@ -16,34 +18,38 @@ class DataNormalization:
         self.data = data
 
     def _normalize_date(self, default_start_date="2010-01-01") -> None:
-        default_start_date = pd.to_datetime(default_start_date, yearfirst=True).date()
-
-        # Converts date stings into datetime objects
-        try:
-            # Checks if a date string is of yyyy-mm-dd format
-            datetime.strptime(self.data.loc[0, "date"], "%Y-%m-%d")
-            self.data.loc[:, "date"] = pd.to_datetime(self.data["date"], yearfirst=True).dt.date
-        except ValueError:
-            self.data.loc[:, "date"] = pd.to_datetime(self.data["date"], dayfirst=True).dt.date
+        # Converts date stings into datetime64 values, trying the explicit formats first
+        if not pd.api.types.is_datetime64_any_dtype(self.data["date"]):
+            self.data = self.data.assign(date=parse_dates(self.data["date"].astype(str)))
+        self.data = self.data.assign(date=self.data["date"].dt.normalize())
 
         # Retains only records that are dated from the default_start_date onwards
-        self.data = self.data.query("date >= @default_start_date")
+        self.data = self.data[self.data["date"] >= pd.Timestamp(default_start_date)]
 
     def _normalize_data_order(self) -> None:
-        self.data = self.data.sort_values(by=["date"])
+        self.data = self.data.sort_values(by=["date"], kind="stable")
 
     def clean(self, default_start_date="2010-01-01") -> pd.DataFrame:
-        self._normalize_date(default_start_date="2010-01-01")
+        self._normalize_date(default_start_date)
         self._normalize_data_order()
 
         return self.data
 
 
 class DbAdapter:
-    def __init__(self, connection):
+    def __init__(self, connection, autocommit=True):
         self.connection = connection
         self.cursor = connection.cursor()
 
+        # When autocommit is disabled, inserted records are only committed once the caller commits the connection
+        self.autocommit = autocommit
+
+    def _transaction(self):
+        """
+        Gets the context in which records are written, which commits them on exit unless autocommit is disabled
+        """
+        return self.connection if self.autocommit else nullcontext()
+
     def _validate_columns(self, table: str, columns: list) -> None:
         table_columns_dict = {
             "headline": ["title", "region", "measurement", "sector"],
@@ -84,8 +90,8 @@ class DbAdapter:
 
             # Skips this step if the records of a particular product haven't been inserted yet
             if last_existing_date[0]:
-                last_existing_date = pd.to_datetime(last_existing_date[0], yearfirst=True).date()
-                data = data.query("date > @last_existing_date")
+                last_existing_date = pd.to_datetime(last_existing_date[0], yearfirst=True)
+                data = data[pd.to_datetime(data["date"], yearfirst=True) > last_existing_date]
 
             return data.reset_index(drop=True), headline_id  # For later use
 
@@ -108,21 +114,40 @@ class DbAdapter:
         # from the number after the last index available in DB
         headlines["id"] = headlines.reset_index(names=["id"])["id"] + 1 + self._get_last_index(table)
 
-        headlines.to_sql(name="analysis_newsheadline", con=self.connection, if_exists="append", index=False)
+        self._insert_rows("analysis_newsheadline", headlines)
 
     def _insert_release_data(self, table: str, release_data: pd.DataFrame) -> None:
         release_data, headline_id = self._remove_existing_records(table, release_data)
         if release_data.shape[0] < 1:
             return None
 
-        # Adds head line id to the dataset
+        # Adds head line id to the dataset, dates are stored as yyyy-mm-dd strings
         release_data.loc[:, "headline_id"] = headline_id
+        release_data["date"] = pd.to_datetime(release_data["date"], yearfirst=True).dt.strftime("%Y-%m-%d")
 
         # Adds id column to match that in DB, and the ids must start
         # from the number after the last index available in DB
         release_data["id"] = release_data.reset_index(names=["id"])["id"] + 1 + self._get_last_index(table)
 
-        release_data.to_sql(name="analysis_newsreleasedata", con=self.connection, if_exists="append", index=False)
+        self._insert_rows("analysis_newsreleasedata", release_data)
+
+    def _insert_rows(self, name: str, data: pd.DataFrame) -> None:
+        """
+        Inserts the rows of a dataset into a DB table with the same columns, unlike DataFrame.to_sql the rows are not
+        committed, so that they are committed in the same transaction as the data version
+        """
+        columns = ", ".join(data.columns)
+        placeholders = ", ".join("?" * len(data.columns))
+        self.cursor.executemany(f"INSERT INTO {name} ({columns}) VALUES ({placeholders})",
+                                data.itertuples(index=False, name=None))
+
+    def _bump_data_version(self) -> None:
+        """
+        Increments the version of the data in DB, which is shared with rankingtable
+        """
+        self.cursor.execute("UPDATE rankingtable_dataversion SET version = version + 1")
+        if self.cursor.rowcount < 1:
+            self.cursor.execute("INSERT INTO rankingtable_dataversion (id, version) VALUES (1, 1)")
 
     def insert_into(self, table: str, data: pd.DataFrame):
         method_dict = {
@@ -133,7 +158,13 @@ class DbAdapter:
             raise Exception("Specified table does not exist in DB")
         self._validate_columns(table, data.columns)
 
-        method_dict[table](table, data)
+        # Cached calculation results become stale once any new record is inserted, the version is bumped in the
+        # same transaction as the records
+        with self._transaction():
+            total_changes = self.connection.total_changes
+            method_dict[table](table, data)
+            if self.connection.total_changes > total_changes:
+                self._bump_data_version()
 
 
 class DataReader:
@@ -182,33 +213,134 @@ class DataReader:
 
         return self.cursor.fetchall()
 
+    def fetch_headline_abbreviations(self) -> list:
+        """
+        Gets the abbreviation of every headline that has one, by which its release data are fetched
+        """
+        self.cursor.execute(
+            "SELECT abbreviation FROM analysis_newsheadline WHERE abbreviation IS NOT NULL "
+            "GROUP BY abbreviation ORDER BY MIN(id)"
+        )
+
+        return self.cursor.fetchall()
+
+    def fetch_releasedata_table(self, start_date: str, end_date: str, abbreviations: list) -> pd.DataFrame:
+        """
+        Gets the release data of multiple headlines in a single query
+        Parameters:
+            start_date: str
+                The start of the date range of the release data
+            end_date: str
+                The end of the date range of the release data
+            abbreviations: list
+                The abbreviations of the headlines
+        Returns:
+            pd.DataFrame
+                A DataFrame indexed by date with a column of values per headline, in the given order, a value is
+                missing if the headline has no release on that date
+        """
+        # The headlines are looked up first, so that the release data of each of them are searched by headline and
+        # date, rather than the whole index of release data being scanned for the matching headlines
+        self.cursor.execute(f"""
+            SELECT record.date, headline.abbreviation, record.value
+            FROM
+                analysis_newsheadline AS headline
+                CROSS JOIN analysis_newsreleasedata AS record
+            ON record.headline_id = headline.id
+            WHERE
+                headline.abbreviation IN ({", ".join("?" * len(abbreviations))}) AND
+                record.date >= ? AND record.date <= ?
+            ORDER BY record.date ASC
+        """, [*abbreviations, start_date, end_date])
+
+        release_data = pd.DataFrame.from_records(self.cursor.fetchall(), columns=["date", "abbreviation", "value"])
+        release_data["date"] = pd.to_datetime(release_data["date"], yearfirst=True)
+        release_data = \
+            release_data.drop_duplicates(subset=["date", "abbreviation"], keep="last") \
+                .pivot(index="date", columns="abbreviation", values="value") \
+                .reindex(columns=abbreviations)
+        release_data.columns.name = None
+
+        return release_data
+
     def fetch_price_records(self, start_date: str, end_date: str, by="", arg="") -> list:
+        """
+        Gets the monthly closes of products from the monthly close table
+        Parameters:
+            start_date: str
+                The start of the date range, every month that overlaps the range is included
+            end_date: str
+                The end of the date range
+            by: str
+                The column by which products are filtered, i.e. "product" for their names
+            arg: str
+                The value of the column
+        Returns:
+            list
+                A list containing tuples of the month, encoded as a yyyymm bucket, and the highest close in it
+        """
         # Executes query with situational arguments
         query_dict = {
             "": "",
             "product": "product.name",
         }
         query = f"{query_dict.get(by)} = ? AND" if by != "" else ""
-        params_list = [arg, start_date, end_date] if by != "" else [start_date, end_date]
+        buckets = [int(pd.Timestamp(date).strftime("%Y%m")) for date in [start_date, end_date]]
+        params_list = [arg, *buckets] if by != "" else buckets
         self.cursor.execute(f"""
-            SELECT record.date, record.close
+            SELECT monthly.bucket, monthly.max_close
             FROM
-                rankingtable_pricerecord AS record
+                rankingtable_pricemonthly AS monthly
                 JOIN rankingtable_product AS product
-            ON record.product_id = product.id
+            ON monthly.product_id = product.id
             WHERE
                 {query}
-                record.date >= ? AND record.date <= ?
-            GROUP BY 
-                strftime('%Y', record.date), 
-                strftime('%m', record.date)
-            HAVING MAX(record.close)
-            ORDER BY record.date ASC
+                monthly.bucket >= ? AND monthly.bucket <= ?
+            ORDER BY monthly.bucket ASC
         """, params_list)
 
         return self.cursor.fetchall()
 
 
+    def fetch_monthly_price_table(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Gets the monthly closes of every product from the monthly close table
+        Parameters:
+            start_date: str
+                The start of the date range, every month that overlaps the range is included
+            end_date: str
+                The end of the date range
+        Returns:
+            pd.DataFrame
+                A DataFrame indexed by month, encoded as a yyyymm bucket, with a column of the last closes per
+                product, which is named after the product or its symbol if it has no name
+        """
+        buckets = [int(pd.Timestamp(date).strftime("%Y%m")) for date in [start_date, end_date]]
+        self.cursor.execute("""
+            SELECT monthly.bucket, COALESCE(product.name, product.symbol), monthly.close
+            FROM
+                rankingtable_pricemonthly AS monthly
+                JOIN rankingtable_product AS product
+            ON monthly.product_id = product.id
+            WHERE monthly.bucket >= ? AND monthly.bucket <= ?
+        """, buckets)
+
+        closes = pd.DataFrame.from_records(self.cursor.fetchall(), columns=["bucket", "product", "close"])
+        closes = closes.pivot(index="bucket", columns="product", values="close").sort_index()
+        closes.columns.name = None
+
+        return closes
+
+    def fetch_data_version(self) -> int:
+        """
+        Gets the version of the data in DB, which is shared with rankingtable and bumped whenever new records
+        are inserted
+        """
+        version = self.cursor.execute("SELECT MAX(version) FROM rankingtable_dataversion").fetchone()[0]
+
+        return version or 0
+
+
 class DbController:
     def __init__(self, connection: sqlite3.Connection):
         self.connection = connection
@@ -218,6 +350,10 @@ class DbController:
         method_dict = {
             "headline": reader.fetch_headline_records,
             "release data": reader.fetch_releasedata_records,
+            "release data table": reader.fetch_releasedata_table,
+            "headline abbreviation": reader.fetch_headline_abbreviations,
+            "monthly price table": reader.fetch_monthly_price_table,
+            "data version": reader.fetch_data_version,
             "price record": reader.fetch_price_records,
         }
         return method_dict.get(record_type)(*args)
@@ -238,14 +374,27 @@ class DbController:
             data = pd.DataFrame(data, columns=["title", "region", "measurement", "sector"])
 
         if table == "release data":
+            # Only the rows that are appended to the file since it was last ingested are read, the records and the
+            # manifest entry of the file are committed in the same transaction
+            manifest = IngestManifest(self.connection)
+            entry = manifest.get(dir)
             try:
-                data = pd.read_csv(dir, names=["date", "value"], skiprows=[0])
+                data, new_entry = read_new_rows(dir, entry, names=["date", "value"], skiprows=[0])
             except UnicodeDecodeError:
                 print(f"File must be of CSV format '{dir}'")
                 return None
 
-            data = DataNormalization(data).clean()
-            data.name = dir.split("\\")[-1].split(".")[0]
+            adapter = DbAdapter(self.connection, autocommit=False)
+            with self.connection:
+                if data is not None and not data.empty:
+                    data = DataNormalization(data).clean()
+                    data.name = dir.split("\\")[-1].split(".")[0]
+                    adapter.insert_into(table, data)
+                if new_entry != entry:
+                    manifest.update(new_entry)
+            if data is not None and not data.empty:
+                print(f"Successfully inserted: {dir}")
+            return None
 
         adapter.insert_into(table, data)
         print(f"Successfully inserted: {dir}")
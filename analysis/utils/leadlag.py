@@ -0,0 +1,222 @@
+from analysis.utils.chartdata import bucket_to_month_key, to_month_key
+from analysis.utils.dboperator import DbController
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import os
+
+
+# The lags in months that are scanned in both directions, and the number of months that a product and
+# a headline must both have a change in at a lag for their correlation to be calculated
+MAX_LAG = 24
+MIN_OBSERVATIONS = 12
+
+
+def to_monthly_changes(data: pd.DataFrame, relative: bool) -> pd.DataFrame:
+    """
+    Calculates the changes between consecutive observations of every series of a table indexed by month key, series
+    are observed in different months (e.g. quarterly releases), so every change is calculated over the observations
+    of its own series and placed on a common monthly grid, where months without a change are missing
+    Parameters:
+        data: pd.DataFrame
+            A DataFrame indexed by month key with a column per series
+        relative: bool
+            Whether the changes are relative (%), e.g. for prices, or absolute, e.g. for rates that can be negative
+    Returns:
+        pd.DataFrame
+            A DataFrame of the changes indexed by every month within the range of the table
+    """
+    months = pd.RangeIndex(data.index.min(), data.index.max() + 1) if not data.empty else pd.RangeIndex(0)
+    changes = dict()
+    for column in data.columns:
+        series = data[column].dropna()
+        changes[column] = series.pct_change().mul(100) if relative else series.diff()
+
+    # Changes from a zero value are undefined
+    return pd.DataFrame(changes, index=months, columns=data.columns).replace([np.inf, -np.inf], np.nan)
+
+
+def _cross_sums(left: np.ndarray, right: np.ndarray, size: int, max_lag: int) -> np.ndarray:
+    """
+    Calculates sum(left[t] * right[t + lag]) of every pair of a left and a right series for every lag at once,
+    from the product of their spectra
+    Parameters:
+        left: np.ndarray
+            The spectra of the left series, of shape (left series, frequencies)
+        right: np.ndarray
+            The spectra of the right series, of shape (right series, frequencies)
+        size: int
+            The length to which the series are zero-padded, which must be at least their length plus max_lag
+            so that the circular correlation does not wrap around within the lags
+    Returns:
+        np.ndarray
+            The sums of shape (right series, left series, lags) for lags from -max_lag to max_lag
+    """
+    sums = np.fft.irfft(np.conj(left)[None, :, :] * right[:, None, :], n=size, axis=-1)
+    lags = np.arange(-max_lag, max_lag + 1) % size
+
+    return sums[:, :, lags]
+
+
+def scan_chunk(products: np.ndarray, headlines: np.ndarray, max_lag=MAX_LAG,
+               min_observations=MIN_OBSERVATIONS) -> tuple:
+    """
+    Calculates the Pearson correlation between every headline and every product, with the product lagging behind
+    by each lag, over the months in which both have a value. The function is defined at module level so that
+    it can be run by worker processes
+    Parameters:
+        products: np.ndarray
+            The changes of the products, of shape (months, products), missing values are NaN
+        headlines: np.ndarray
+            The changes of the headlines on the same months, of shape (months, headlines)
+        max_lag: int
+            The largest lag in months in both directions
+        min_observations: int
+            The number of months below which a correlation is not calculated
+    Returns:
+        tuple
+            The correlations and the numbers of months they are calculated over, both of shape
+            (products, headlines, lags), a correlation is NaN if it cannot be calculated
+    """
+    size = 1 << int(len(products) + max_lag - 1).bit_length()
+
+    # Missing values are masked out of every sum, so that every lag only counts the months in which both
+    # series have a value, the series are standardized first to keep the sums well conditioned
+    spectra = dict()
+    for name, values in [("product", products), ("headline", headlines)]:
+        mask = ~np.isnan(values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+        values = np.where(mask, values, 0).T
+        spectra[name] = {
+            "mask": np.fft.rfft(mask.T.astype(float), n=size, axis=-1),
+            "value": np.fft.rfft(values, n=size, axis=-1),
+            "square": np.fft.rfft(values ** 2, n=size, axis=-1),
+        }
+    headline, product = spectra["headline"], spectra["product"]
+
+    observations = np.rint(_cross_sums(headline["mask"], product["mask"], size, max_lag))
+    headline_sum = _cross_sums(headline["value"], product["mask"], size, max_lag)
+    product_sum = _cross_sums(headline["mask"], product["value"], size, max_lag)
+    cross_sum = _cross_sums(headline["value"], product["value"], size, max_lag)
+    headline_squares = _cross_sums(headline["square"], product["mask"], size, max_lag)
+    product_squares = _cross_sums(headline["mask"], product["square"], size, max_lag)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = observations * cross_sum - headline_sum * product_sum
+        variance = (observations * headline_squares - headline_sum ** 2) \
+                   * (observations * product_squares - product_sum ** 2)
+        correlation = covariance / np.sqrt(variance)
+    correlation[(observations < min_observations) | ~(variance > 1e-9)] = np.nan
+
+    return np.clip(correlation, -1, 1), observations.astype(int)
+
+
+class LeadLagScanner:
+    """
+    Scans the cross-correlation between the monthly changes of every product and every headline for lags from
+    -max_lag to max_lag months, a positive lag means that the headline leads the product. Products are split into
+    chunks that are scanned in a pool of worker processes, all the pairs of a chunk are scanned at once
+    """
+    def __init__(self, max_lag=MAX_LAG, min_observations=MIN_OBSERVATIONS, workers=None, chunk_size=32):
+        self.max_lag = max_lag
+        self.min_observations = min_observations
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def load(self, controller: DbController, start_date: str, end_date: str) -> tuple:
+        """
+        Gets the monthly changes of every product and every headline in a given time range
+        Returns:
+            tuple
+                Two DataFrames of the relative changes (%) of the monthly closes of the products and the changes
+                of the release data of the headlines, indexed by the same months
+        """
+        prices = controller.fetch_records("monthly price table", start_date, end_date)
+        prices.index = bucket_to_month_key(prices.index)
+
+        abbreviations = [abbreviation for abbreviation, in controller.fetch_records("headline abbreviation")]
+        release_data = controller.fetch_records("release data table", start_date, end_date, abbreviations)
+        release_data = release_data.groupby(to_month_key(release_data.index)).last()
+
+        prices = to_monthly_changes(prices, relative=True)
+        release_data = to_monthly_changes(release_data, relative=False)
+
+        # Lags are counted in rows, so the months must be consecutive
+        months = prices.index.union(release_data.index)
+        months = pd.RangeIndex(months.min(), months.max() + 1) if not months.empty else months
+
+        return prices.reindex(months), release_data.reindex(months)
+
+    def scan(self, prices: pd.DataFrame, release_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scans every pair of a product and a headline
+        Parameters:
+            prices: pd.DataFrame
+                The changes of the products, as returned by load method
+            release_data: pd.DataFrame
+                The changes of the headlines on the same months
+        Returns:
+            pd.DataFrame
+                A DataFrame containing the product, headline, lag, correlation and number of observations of every
+                pair at every lag, pairs whose correlation cannot be calculated at a lag are left out
+        """
+        lags = np.arange(-self.max_lag, self.max_lag + 1)
+        columns = ["product", "headline", "lag", "correlation", "observations"]
+        if prices.empty or release_data.empty or len(prices) <= self.min_observations:
+            return pd.DataFrame(columns=columns)
+
+        products = prices.to_numpy(dtype=float)
+        headlines = release_data.to_numpy(dtype=float)
+        chunks = [
+            products[:, start:start + self.chunk_size] for start in range(0, products.shape[1], self.chunk_size)
+        ]
+        arguments = [chunks, [headlines] * len(chunks), [self.max_lag] * len(chunks),
+                     [self.min_observations] * len(chunks)]
+
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+                results = list(executor.map(scan_chunk, *arguments))
+        else:
+            results = list(map(scan_chunk, *arguments))
+        correlation = np.concatenate([result[0] for result in results])
+        observations = np.concatenate([result[1] for result in results])
+
+        # Flattens the (product, headline, lag) arrays into one row per pair and lag
+        product_index, headline_index, lag_index = np.indices(correlation.shape).reshape(3, -1)
+        profiles = pd.DataFrame({
+            "product": prices.columns.to_numpy()[product_index],
+            "headline": release_data.columns.to_numpy()[headline_index],
+            "lag": lags[lag_index],
+            "correlation": correlation.ravel(),
+            "observations": observations.ravel(),
+        })
+
+        return profiles.dropna(subset=["correlation"]).reset_index(drop=True)
+
+    def rank(self, profiles: pd.DataFrame) -> pd.DataFrame:
+        """
+        Gets the lag at which every pair is the most significantly correlated in either direction, pairs are sorted
+        from the most to the least significant. Correlations are compared by their Fisher z-statistic, which grows
+        with the number of observations, so that the edge lags, over which only a few months overlap, do not win
+        merely because the correlations of small samples vary more
+        Parameters:
+            profiles: pd.DataFrame
+                The correlations of every pair at every lag, as returned by scan method
+        Returns:
+            pd.DataFrame
+                A DataFrame with the same columns as the profiles, one row per pair
+        """
+        if profiles.empty:
+            return profiles
+
+        correlation = profiles["correlation"].abs().clip(upper=1 - 1e-12)
+        strength = np.arctanh(correlation) * np.sqrt(profiles["observations"] - 3)
+        ranking = \
+            profiles.loc[strength.groupby([profiles["product"], profiles["headline"]]).idxmax()] \
+                .assign(strength=strength) \
+                .sort_values(by=["strength", "product", "headline"], ascending=[False, True, True]) \
+                .drop(columns=["strength"])
+
+        return ranking.reset_index(drop=True)
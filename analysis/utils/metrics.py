@@ -22,6 +22,10 @@ class MetricsCalculator:
         metrics_dict = {
             "cumulative_change": self._cumulative_change,
             "correlation": self._correlation,
+            "autocorrelation": self._autocorrelation,
+            "w_relative_change_distribution": self._w_relative_change_distribution,
+            "linear_regression": self._linear_regression,
+            "regression": self._linear_regression,
         }
         for measurement in metrics:
             if measurement not in metrics_dict:
@@ -29,31 +33,117 @@ class MetricsCalculator:
 
         return metrics_dict
 
+    def _get_series(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Gets the numeric columns of the dataset, i.e. every series but the labels of its rows
+        """
+        return data.select_dtypes(include="number")
+
     def _cumulative_change(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculates the cumulative sum of the relative changes (%) between consecutive values of every series
+        """
         cumulative_change = \
-            data["value"].rolling(2).apply(
-                lambda s: ((s.tail(1).values - s.head(1).values) / s.head(1).values) * 100
-            ).cumsum().round(decimals=2).fillna(0)
+            self._get_series(data).pct_change(fill_method=None).mul(100) \
+                .cumsum().round(decimals=2).fillna(0)
+        if "date" in data.columns:
+            cumulative_change.insert(0, "date", data["date"])
+
         return cumulative_change
 
     def _correlation(self, data: pd.DataFrame) -> pd.DataFrame:
         correlation = data.corr(numeric_only=True).round(decimals=3)
         return correlation.reset_index()
 
-    def _autocorrelation(self, data: pd.DataFrame) -> pd.DataFrame:
-        pass
+    def _autocorrelation(self, data: pd.DataFrame, max_lag=12) -> pd.DataFrame:
+        """
+        Calculates the autocorrelation of every series for lags of 1 up to max_lag observations. The autocovariances
+        of all lags are derived at once from the power spectrum of the series, which is zero-padded so that the
+        circular convolution of the FFT does not wrap around
+        """
+        series = self._get_series(data)
+        size = len(series)
+        if size == 0:
+            return pd.DataFrame(columns=["lag"] + series.columns.to_list())
+
+        values = series.to_numpy(dtype=float)
+        values = values - values.mean(axis=0)
+
+        spectrum = np.fft.rfft(values, n=2 * size, axis=0)
+        autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), n=2 * size, axis=0)[:size]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            autocorrelation = autocovariance / autocovariance[0]
+
+        lags = np.arange(1, min(max_lag, size - 1) + 1)
+        autocorrelation = pd.DataFrame(autocorrelation[lags], columns=series.columns).round(decimals=3)
+        autocorrelation.insert(0, "lag", lags)
+
+        return autocorrelation
+
+    def _w_relative_change_distribution(self, data: pd.DataFrame, bins=10) -> pd.DataFrame:
+        """
+        Calculates the distribution of the relative changes (%) between consecutive values of every series, i.e.
+        the share (%) of the changes of a series that fall into each of the bins shared by every series
+        """
+        series = self._get_series(data)
+        changes = series.pct_change(fill_method=None).mul(100).to_numpy()[1:]
+        finite = np.isfinite(changes)
+        if not finite.any():
+            return pd.DataFrame(columns=["range"] + series.columns.to_list())
 
-    def _w_relative_change_distribution(self, data: pd.DataFrame) -> pd.DataFrame:
-        pass
+        # Bins every change of every series at once, then counts the changes of each series in each bin
+        edges = np.histogram_bin_edges(changes[finite], bins=bins)
+        positions = np.clip(np.searchsorted(edges, changes, side="right") - 1, 0, bins - 1)
+        positions = positions + np.arange(changes.shape[1]) * bins
+        counts = np.bincount(positions[finite], minlength=bins * changes.shape[1]).reshape(-1, bins).T
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distribution = pd.DataFrame(counts / finite.sum(axis=0) * 100, columns=series.columns).round(decimals=2)
+        distribution.insert(0, "range", [f"{low:.2f}% to {high:.2f}%" for low, high in zip(edges[:-1], edges[1:])])
+
+        return distribution
 
     def _linear_regression(self, data: pd.DataFrame) -> pd.DataFrame:
-        pass
+        """
+        Fits the least squares line of the product against every other series at once, all the fits share the
+        centered product values, so that every slope is the covariance of a series and the product over its variance
+        """
+        series = self._get_series(data)
+        product = getattr(data, "name", None)
+        product = product if product in series.columns else series.columns[0]
+
+        y = series[product].to_numpy(dtype=float)
+        x = series.drop(columns=[product]).to_numpy(dtype=float)
+        x_centered = x - x.mean(axis=0)
+        y_centered = y - y.mean()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (x_centered * y_centered[:, None]).sum(axis=0) / (x_centered ** 2).sum(axis=0)
+            intercept = y.mean() - slope * x.mean(axis=0)
+            r_squared = 1 - ((y_centered[:, None] - slope * x_centered) ** 2).sum(axis=0) / (y_centered ** 2).sum()
+
+        regression = pd.DataFrame({
+            "series": series.columns.drop(product),
+            "slope": slope,
+            "intercept": intercept,
+            "r_squared": r_squared,
+        })
+
+        return regression.round({"slope": 4, "intercept": 4, "r_squared": 3})
+
+    def _to_json_compliant(self, result: pd.DataFrame) -> pd.DataFrame:
+        """
+        Replaces the values that cannot be calculated, e.g. the 0/0 of a constant series, with None, since NaN and
+        infinite values are not JSON compliant
+        """
+        result = result.replace([np.inf, -np.inf], np.nan)
+        return result.astype(object).where(result.notna(), None)
 
     def calc(self, metrics: list) -> pd.DataFrame:
         metrics_dict = self._validate_metrics(metrics)
         result = dict()
         for measurement in metrics:
             result.update({
-                measurement: metrics_dict[measurement](self.data)
+                measurement: self._to_json_compliant(metrics_dict[measurement](self.data))
             })
         return result
@@ -1,13 +1,13 @@
 import os
-import sqlite3
 from analysis.utils.dboperator import DbController
+from rankingtable.utils.connection import get_connection_manager
 
 
 # Config variable
 BASE_DIR = ".\\"
 
 def update() -> None:
-    with sqlite3.connect(BASE_DIR + "db.sqlite3") as connection:
+    with get_connection_manager(BASE_DIR + "db.sqlite3").writer() as connection:
         controller = DbController(connection)
         data_dir = os.path.abspath(BASE_DIR + "Data\\News")
         for folder in os.listdir(data_dir):
@@ -1,13 +1,15 @@
 from analysis.utils.dboperator import DbController
 from analysis.utils.chartdata import DataMixer
 from analysis.utils.metrics import MetricsCalculator
+from analysis.utils.leadlag import LeadLagScanner
+from rankingtable.utils.connection import get_connection_manager
+from rankingtable.utils.cache import MetricsCache
 
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 import json
-import sqlite3
 import pandas as pd
 from datetime import datetime
 
@@ -22,6 +24,13 @@ START_DATE = config["start_date"]
 END_DATE = config["end_date"]
 DATA_CFG = config["sector_mapping"]
 
+# Every thread keeps its read connection to DB alive across requests
+connections = get_connection_manager(DB_DIR)
+
+# Lead-lag scans of every product against every headline are cached until new records are inserted into DB
+lead_lag_scanner = LeadLagScanner()
+lead_lag_cache = MetricsCache(max_entries=4)
+
 def get_chart_data(controller: DbController,
                    start_date: str, end_date: str,
                    product: str, sector: str) -> dict:
@@ -51,7 +60,7 @@ def get_response(start_date: str, end_date: str,
     """
     Gets records from DB and wrap them into a dictionary as response
     """
-    with sqlite3.connect(DB_DIR) as connection:
+    with connections.reader() as connection:
         controller = DbController(connection)
 
         if data_category == "chart":
@@ -72,6 +81,39 @@ def get_response(start_date: str, end_date: str,
             }
 
 
+def get_lead_lag(start_date: str, end_date: str, product=None) -> list:
+    """
+    Gets the lag at which every product is the most significantly correlated with every headline, sorted from the
+    most to the least significant pair, along with the correlations at every lag if a product is specified
+    """
+    with connections.reader() as connection:
+        controller = DbController(connection)
+        data_version = controller.fetch_records("data version")
+
+        key = ("lead lag", start_date, end_date)
+        scan = lead_lag_cache.get(key, data_version)
+        if scan is None:
+            profiles = lead_lag_scanner.scan(*lead_lag_scanner.load(controller, start_date, end_date))
+            scan = {"profiles": profiles, "ranking": lead_lag_scanner.rank(profiles)}
+            lead_lag_cache.set(key, data_version, scan)
+
+    ranking = scan["ranking"].round({"correlation": 3})
+    if product is None:
+        return ranking.to_dict(orient="records")
+
+    ranking = ranking[ranking["product"] == product]
+    profiles = scan["profiles"][scan["profiles"]["product"] == product].round({"correlation": 3})
+    profiles = {
+        headline: records[["lag", "correlation", "observations"]].to_dict(orient="records")
+        for headline, records in profiles.groupby("headline", sort=False)
+    }
+    response = ranking.to_dict(orient="records")
+    for dictionary in response:
+        dictionary.update({"profile": profiles.get(dictionary["headline"], list())})
+
+    return response
+
+
 class ChartData(APIView):
     def get(self, request, **kwargs):
         response = get_response(start_date=START_DATE, end_date=END_DATE,
@@ -86,3 +128,12 @@ class TableData(APIView):
                                 product=kwargs["product"], sector=kwargs["sector"],
                                 data_category="table", metric=kwargs["metric"])
         return Response(response, status=status.HTTP_200_OK)
+
+
+class LeadLag(APIView):
+    """
+    Lead-lag cross-correlations between products and headlines, a positive lag means that the headline leads
+    """
+    def get(self, request, **kwargs):
+        response = get_lead_lag(START_DATE, END_DATE, product=kwargs.get("product"))
+        return Response(response, status=status.HTTP_200_OK)
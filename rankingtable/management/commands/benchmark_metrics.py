@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from rankingtable.utils import benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmarks every ranking metric on every period with synthetic price records"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", action="append", choices=list(benchmark.SCALES),
+                            help="The scale of the synthetic records, can be repeated (default: tiny)")
+        parser.add_argument("--metric", action="append", choices=benchmark.METRICS,
+                            help="The metric to be benchmarked, can be repeated (default: all)")
+        parser.add_argument("--period", action="append", choices=benchmark.PERIODS,
+                            help="The period to be benchmarked, can be repeated (default: all)")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="The number of runs of every benchmark, the fastest one is kept")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark_metrics.json",
+                            help="The JSON file to which the results are saved")
+
+    def handle(self, *args, **options):
+        report = benchmark.run(
+            options["scale"] or ["tiny"],
+            options["metric"] or benchmark.METRICS,
+            options["period"] or benchmark.PERIODS,
+            options["repeat"], options["seed"]
+        )
+        benchmark.save(report, options["output"])
+
+        for result in report["results"]:
+            self.stdout.write(
+                f"{result['scale']:>8} {result['period']} {result['metric']:<16} "
+                f"{result['seconds']:>10.4f}s {result['peak_memory_bytes'] / 2 ** 20:>10.1f}MiB"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
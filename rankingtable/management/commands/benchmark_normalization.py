@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from rankingtable.utils import benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the throughput of the normalization of raw price records and release data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", action="append", type=int,
+                            help="The number of raw rows to be normalized, can be repeated (default: 100000)")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="The number of runs of every benchmark, the fastest one is kept")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark_normalization.json",
+                            help="The JSON file to which the results are saved")
+
+    def handle(self, *args, **options):
+        report = benchmark.run_normalization(options["rows"] or [100000], options["repeat"], options["seed"])
+        benchmark.save(report, options["output"])
+
+        for result in report["results"]:
+            self.stdout.write(
+                f"{result['input']:<12} {result['rows']:>10} rows {result['seconds']:>10.4f}s "
+                f"{result['rows_per_second']:>12} rows/s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
@@ -0,0 +1,155 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+import sqlite3
+
+
+# The hot queries of both apps, along with sample parameters and the index each of them is expected to use,
+# the UNIQUE constraints, e.g. (product_id, date) of rankingtable_pricerecord, are backed by automatic indexes
+HOT_QUERIES = [
+    {
+        "name": "rankingtable: latest date of every product (DataReader.fetch_latest_date_records)",
+        "query": """
+            SELECT assetclass.name, product.symbol, product.alias, latest.date
+            FROM
+                rankingtable_assetclass AS assetclass
+                JOIN rankingtable_productlatest AS latest
+                JOIN rankingtable_product AS product
+            ON
+                assetclass.id = product.assetclass_id
+                AND latest.product_id = product.id
+        """,
+        "params": [],
+        "index": "INTEGER PRIMARY KEY",
+    },
+    {
+        "name": "rankingtable: latest date of a product (DbAdapter._remove_existing_records)",
+        "query": "SELECT date FROM rankingtable_productlatest WHERE product_id = ?",
+        "params": [1],
+        "index": "sqlite_autoindex_rankingtable_productlatest",
+    },
+    {
+        "name": "rankingtable: least recent date of every asset class (update.update)",
+        "query": """
+            SELECT assetclass.name, MIN(latest.date)
+            FROM
+                rankingtable_assetclass AS assetclass
+                JOIN rankingtable_product AS product
+                JOIN rankingtable_productlatest AS latest
+            ON
+                assetclass.id = product.assetclass_id
+                AND latest.product_id = product.id
+            GROUP BY assetclass.name
+        """,
+        "params": [],
+        "index": "sqlite_autoindex_rankingtable_productlatest",
+    },
+    {
+        "name": "rankingtable: price records in a date range",
+        "query": """
+            SELECT record.product_id, record.date, record.close
+            FROM rankingtable_pricerecord AS record
+            WHERE record.date >= ? AND record.date <= ?
+        """,
+        "params": ["2024-01-01", "2024-12-31"],
+        "index": "pricerecord_date_close_idx",
+    },
+    {
+        "name": "analysis: monthly closes of a product (DataReader.fetch_price_records)",
+        "query": """
+            SELECT monthly.bucket, monthly.max_close
+            FROM
+                rankingtable_pricemonthly AS monthly
+                JOIN rankingtable_product AS product
+            ON monthly.product_id = product.id
+            WHERE
+                product.name = ? AND
+                monthly.bucket >= ? AND monthly.bucket <= ?
+            ORDER BY monthly.bucket ASC
+        """,
+        "params": ["S&P 500", 201001, 203001],
+        "index": "sqlite_autoindex_rankingtable_pricemonthly",
+    },
+    {
+        "name": "analysis: last date of a headline (DbAdapter._remove_existing_records)",
+        "query": "SELECT MAX(date) FROM analysis_newsreleasedata WHERE headline_id = ?",
+        "params": [1],
+        "index": "releasedata_headline_date_idx",
+    },
+    {
+        "name": "analysis: release data of a headline (DataReader.fetch_releasedata_records)",
+        "query": """
+            SELECT record.date, record.value
+            FROM
+                analysis_newsheadline AS headline
+                JOIN analysis_newsreleasedata AS record
+            ON record.headline_id = headline.id
+            WHERE
+                headline.abbreviation = ? AND
+                record.date >= ? AND record.date <= ?
+            ORDER BY record.date ASC
+        """,
+        "params": ["CPI", "2010-01-01", "2030-01-01"],
+        "index": "releasedata_headline_date_idx",
+    },
+    {
+        "name": "analysis: release data of multiple headlines (DataReader.fetch_releasedata_table)",
+        "query": """
+            SELECT record.date, headline.abbreviation, record.value
+            FROM
+                analysis_newsheadline AS headline
+                CROSS JOIN analysis_newsreleasedata AS record
+            ON record.headline_id = headline.id
+            WHERE
+                headline.abbreviation IN (?, ?, ?) AND
+                record.date >= ? AND record.date <= ?
+            ORDER BY record.date ASC
+        """,
+        "params": ["CPI", "Core CPI", "Core PCE Price Index", "2010-01-01", "2030-01-01"],
+        "index": "releasedata_headline_date_idx",
+    },
+]
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN QUERY PLAN on the hot queries and checks that each of them searches its index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--analyze", action="store_true",
+                            help="Runs ANALYZE first, which writes the statistics of every table and index to DB")
+
+    def handle(self, *args, **options):
+        failures = list()
+        # The check is read-only unless the statistics are explicitly updated
+        path = settings.DATABASES["default"]["NAME"]
+        if options["analyze"]:
+            connection = sqlite3.connect(path)
+        else:
+            connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+        try:
+            cursor = connection.cursor()
+            if options["analyze"]:
+                # Lets the query planner know the size of every table and index
+                cursor.execute("ANALYZE")
+                connection.commit()
+
+            for hot_query in HOT_QUERIES:
+                cursor.execute("EXPLAIN QUERY PLAN " + hot_query["query"], hot_query["params"])
+                plan = [row[-1] for row in cursor.fetchall()]
+
+                # A SCAN through an index still reads all of it, the index must be searched
+                uses_index = any(detail.startswith("SEARCH") and hot_query["index"] in detail for detail in plan)
+
+                style = self.style.SUCCESS if uses_index else self.style.ERROR
+                self.stdout.write(style(f"{'OK' if uses_index else 'FAIL'}  {hot_query['name']}"))
+                for detail in plan:
+                    self.stdout.write(f"      {detail}")
+
+                if not uses_index:
+                    failures.append(hot_query["name"])
+        finally:
+            connection.close()
+
+        if failures:
+            raise CommandError(f"{len(failures)} queries do not search their indexes: {failures}")
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from rankingtable.utils import update
+from rankingtable.utils.connection import get_connection_manager
+from rankingtable.utils.downloader import Downloader
+from rankingtable.utils.scheduler import UpdateScheduler, to_utc
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Runs the daemon that refreshes the price records of every product that is behind after its market closes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Schedules and runs the due jobs once, then exits")
+        parser.add_argument("--interval", type=float, default=900,
+                            help="The maximum time in seconds between two cycles")
+        parser.add_argument("--delay", type=float, default=1800,
+                            help="The time in seconds that jobs wait after the close of a session")
+        parser.add_argument("--max-attempts", type=int, default=3)
+        parser.add_argument("--workers", type=int, default=8,
+                            help="The number of concurrent downloads")
+        parser.add_argument("--data-dir", default=update.BASE_DIR + "Data\\Price",
+                            help="The directory of the CSV files of the price records")
+        parser.add_argument("--no-archive", dest="archive", action="store_false",
+                            help="Does not append the downloaded records to the CSV files")
+
+    def _get_scheduler(self, connection, downloader: Downloader, options: dict) -> UpdateScheduler:
+        """
+        Creates the scheduler of a cycle on the writer connection lent to it
+        """
+        return UpdateScheduler(
+            connection, options["data_dir"], downloader, archive=options["archive"],
+            delay=options["delay"], max_attempts=options["max_attempts"]
+        )
+
+    def handle(self, *args, **options):
+        # The updater is the only writer of DB, readers of the web tier are never blocked by its jobs. The writer
+        # connection is only held during a cycle, so that other writers of the process can use it in between
+        connections = get_connection_manager(settings.DATABASES["default"]["NAME"])
+        downloader = Downloader(workers=options["workers"])
+        try:
+            # Resume the jobs interrupted by the last run
+            with connections.writer() as connection:
+                recovered = self._get_scheduler(connection, downloader, options).recover()
+            if recovered:
+                self.stdout.write(f"Resumed {recovered} interrupted job(s)")
+
+            while True:
+                with connections.writer() as connection:
+                    scheduler = self._get_scheduler(connection, downloader, options)
+                    scheduled = scheduler.schedule()
+                    results = scheduler.run_pending()
+                    wakeup = scheduler.next_wakeup()
+
+                if scheduled:
+                    self.stdout.write(f"Scheduled {scheduled} job(s)")
+                for symbol, result in results.items():
+                    style = self.style.SUCCESS if result == "done" else self.style.ERROR
+                    self.stdout.write(style(f"{symbol}: {result}"))
+
+                if options["once"]:
+                    break
+
+                seconds = min(max((wakeup - to_utc()).total_seconds(), 1), options["interval"])
+                self.stdout.write(f"Next cycle in {seconds:.0f}s")
+                time.sleep(seconds)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped, running jobs are resumed on the next start")
+        finally:
+            connections.close()
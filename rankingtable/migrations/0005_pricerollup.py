@@ -0,0 +1,84 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:26
+
+import django.db.models.deletion
+import pandas as pd
+from django.db import migrations, models
+
+
+def to_rollup(price_records: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    Aggregates daily records into the OHLC bars of a period, whose time periods are encoded into a single integer
+    bucket (yyyyww for weeks, yyyymm for months and yyyy for years). The aggregation is copied into the migration,
+    so that what it does never changes with the helpers of the app
+    """
+    dates = pd.PeriodIndex(price_records["date"], freq="D")
+    periods = {"y": dates.year, "w": dates.week, "m": dates.month}
+    keys = [price_records["product_id"], pd.Series(periods["y"], index=price_records.index, name="y")]
+    if period != "y":
+        keys.append(pd.Series(periods[period], index=price_records.index, name=period))
+
+    bars = \
+        price_records.groupby(keys) \
+            .agg(open=("open", "first"), high=("high", "max"), low=("low", "min"), close=("close", "last"),
+                 first_date=("date", "first"), date=("date", "last")) \
+            .reset_index()
+    bars["bucket"] = bars["y"] * 100 + bars[period] if period != "y" else bars["y"]
+
+    return bars
+
+
+def backfill_price_rollup(apps, schema_editor):
+    """
+    Aggregates the price records already existing in DB into the rollup table
+    """
+    PriceRecord = apps.get_model("rankingtable", "PriceRecord")
+    PriceRollup = apps.get_model("rankingtable", "PriceRollup")
+
+    price_records = pd.DataFrame.from_records(
+        PriceRecord.objects.order_by("product_id", "date").values("product_id", "date", "open", "high", "low", "close")
+    )
+    if price_records.empty:
+        return None
+    price_records["date"] = pd.to_datetime(price_records["date"], yearfirst=True)
+
+    rollups = list()
+    for period in ["w", "m", "y"]:
+        bars = to_rollup(price_records, period)
+        rollups.extend(
+            PriceRollup(period=period, bucket=bar.bucket,
+                        open=bar.open, high=bar.high, low=bar.low, close=bar.close,
+                        first_date=bar.first_date.date(), date=bar.date.date(),
+                        product_id=bar.product_id)
+            for bar in bars.itertuples(index=False)
+        )
+    PriceRollup.objects.bulk_create(rollups, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0004_alter_assetclass_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=1)),
+                ('bucket', models.IntegerField()),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('first_date', models.DateField()),
+                ('date', models.DateField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='rankingtable.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pricerollup',
+            constraint=models.UniqueConstraint(fields=('product', 'period', 'bucket'), name='unique_product_period_bucket'),
+        ),
+        migrations.RunPython(backfill_price_rollup, migrations.RunPython.noop),
+    ]
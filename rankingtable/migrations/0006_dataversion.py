@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+def create_data_version(apps, schema_editor):
+    """
+    Creates the single row holding the version of the data in DB
+    """
+    DataVersion = apps.get_model("rankingtable", "DataVersion")
+    DataVersion.objects.create(id=1, version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0005_pricerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+    ]
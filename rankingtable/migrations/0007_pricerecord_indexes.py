@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0006_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pricerecord',
+            index=models.Index(fields=['product', 'date'], name='pricerecord_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricerecord',
+            index=models.Index(fields=['date', 'product', 'close'], name='pricerecord_date_close_idx'),
+        ),
+    ]
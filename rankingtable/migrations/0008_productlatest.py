@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0007_pricerecord_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductLatest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('date', models.DateField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, to='rankingtable.product')),
+            ],
+        ),
+        # Copies the latest price record of every product already existing in DB
+        migrations.RunSQL(
+            """
+            INSERT INTO rankingtable_productlatest (product_id, date, open, high, low, close)
+            SELECT record.product_id, record.date, record.open, record.high, record.low, record.close
+            FROM
+                rankingtable_pricerecord AS record
+                JOIN (
+                    SELECT product_id, MAX(date) AS date
+                    FROM rankingtable_pricerecord
+                    GROUP BY product_id
+                ) AS latest
+            ON
+                record.product_id = latest.product_id
+                AND record.date = latest.date
+            GROUP BY record.product_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
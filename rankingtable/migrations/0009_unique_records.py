@@ -0,0 +1,171 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:33
+
+import pandas as pd
+from django.db import migrations, models
+
+
+def to_rollup(price_records: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    Aggregates daily records into the OHLC bars of a period, whose time periods are encoded into a single integer
+    bucket (yyyyww for weeks, yyyymm for months and yyyy for years), the same as the backfill of 0005_pricerollup.
+    The aggregation is copied into the migration, so that what it does never changes with the helpers of the app
+    """
+    dates = pd.PeriodIndex(price_records["date"], freq="D")
+    periods = {"y": dates.year, "w": dates.week, "m": dates.month}
+    keys = [price_records["product_id"], pd.Series(periods["y"], index=price_records.index, name="y")]
+    if period != "y":
+        keys.append(pd.Series(periods[period], index=price_records.index, name=period))
+
+    bars = \
+        price_records.groupby(keys) \
+            .agg(open=("open", "first"), high=("high", "max"), low=("low", "min"), close=("close", "last"),
+                 first_date=("date", "first"), date=("date", "last")) \
+            .reset_index()
+    bars["bucket"] = bars["y"] * 100 + bars[period] if period != "y" else bars["y"]
+
+    return bars
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merges the asset classes and the products that share the same name and symbol into the first of them, and keeps
+    only the first of the price records that share the same product and date, so that the UNIQUE constraints can be
+    added. The rollup and latest record tables of the affected products are then rebuilt from the remaining records
+    """
+    with schema_editor.connection.cursor() as cursor:
+        # Points the products of every duplicate asset class to the first asset class of the same name
+        cursor.execute("""
+            UPDATE rankingtable_product
+            SET assetclass_id = (
+                SELECT MIN(first.id)
+                FROM
+                    rankingtable_assetclass AS first
+                    JOIN rankingtable_assetclass AS current
+                ON first.name = current.name
+                WHERE current.id = rankingtable_product.assetclass_id
+            )
+        """)
+        cursor.execute("""
+            DELETE FROM rankingtable_assetclass
+            WHERE id NOT IN (SELECT MIN(id) FROM rankingtable_assetclass GROUP BY name)
+        """)
+
+        # Every duplicate product along with the first product of the same symbol
+        cursor.execute("""
+            SELECT product.id, first.id
+            FROM
+                rankingtable_product AS product
+                JOIN (
+                    SELECT symbol, MIN(id) AS id
+                    FROM rankingtable_product
+                    GROUP BY symbol
+                ) AS first
+            ON product.symbol = first.symbol
+            WHERE product.id <> first.id
+        """)
+        duplicates = cursor.fetchall()
+
+        # The first product takes over the records of its duplicates, along with the attributes it lacks, the bars
+        # and latest records of the duplicates are dropped and rebuilt for the first product
+        for duplicate_id, first_id in duplicates:
+            cursor.execute("""
+                UPDATE rankingtable_product
+                SET
+                    name = COALESCE(name, (SELECT name FROM rankingtable_product WHERE id = %s)),
+                    alias = COALESCE(alias, (SELECT alias FROM rankingtable_product WHERE id = %s))
+                WHERE id = %s
+            """, [duplicate_id, duplicate_id, first_id])
+            cursor.execute("UPDATE rankingtable_pricerecord SET product_id = %s WHERE product_id = %s",
+                           [first_id, duplicate_id])
+            for table in ["rankingtable_pricerollup", "rankingtable_productlatest"]:
+                cursor.execute(f"DELETE FROM {table} WHERE product_id = %s", [duplicate_id])
+            cursor.execute("DELETE FROM rankingtable_product WHERE id = %s", [duplicate_id])
+
+        # Keeps only the first of the price records sharing the same product and date
+        cursor.execute("""
+            SELECT DISTINCT product_id
+            FROM rankingtable_pricerecord
+            GROUP BY product_id, date
+            HAVING COUNT(*) > 1
+        """)
+        product_ids = {product_id for product_id, in cursor.fetchall()}
+        product_ids = sorted(product_ids | {first_id for _, first_id in duplicates})
+        cursor.execute("""
+            DELETE FROM rankingtable_pricerecord
+            WHERE id NOT IN (
+                SELECT MIN(id)
+                FROM rankingtable_pricerecord
+                GROUP BY product_id, date
+            )
+        """)
+        if not product_ids:
+            return None
+
+        # Rebuilds the bars and the latest records of the affected products
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        for table in ["rankingtable_pricerollup", "rankingtable_productlatest"]:
+            cursor.execute(f"DELETE FROM {table} WHERE product_id IN ({placeholders})", product_ids)
+
+        cursor.execute(f"""
+            SELECT product_id, date, open, high, low, close
+            FROM rankingtable_pricerecord
+            WHERE product_id IN ({placeholders})
+            ORDER BY product_id, date
+        """, product_ids)
+        price_records = pd.DataFrame.from_records(
+            cursor.fetchall(), columns=["product_id", "date", "open", "high", "low", "close"]
+        )
+        if price_records.empty:
+            return None
+        price_records["date"] = pd.to_datetime(price_records["date"], yearfirst=True)
+
+        for period in ["w", "m", "y"]:
+            bars = to_rollup(price_records, period)
+            cursor.executemany("""
+                INSERT INTO rankingtable_pricerollup
+                    (period, bucket, open, high, low, close, first_date, date, product_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                (period, int(bar.bucket), bar.open, bar.high, bar.low, bar.close,
+                 bar.first_date.strftime("%Y-%m-%d"), bar.date.strftime("%Y-%m-%d"), int(bar.product_id))
+                for bar in bars.itertuples(index=False)
+            ])
+
+        latest_records = price_records.groupby("product_id").tail(1)
+        cursor.executemany("""
+            INSERT INTO rankingtable_productlatest (product_id, date, open, high, low, close)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [
+            (int(record.product_id), record.date.strftime("%Y-%m-%d"),
+             record.open, record.high, record.low, record.close)
+            for record in latest_records.itertuples(index=False)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0008_productlatest'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='pricerecord',
+            name='pricerecord_product_date_idx',
+        ),
+        migrations.AlterField(
+            model_name='assetclass',
+            name='name',
+            field=models.CharField(max_length=30, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='symbol',
+            field=models.CharField(max_length=30, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='pricerecord',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='unique_product_date'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0010_ingestmanifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpdateJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(null=True)),
+                ('scheduled_at', models.DateTimeField()),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='rankingtable.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'scheduled_at'], name='updatejob_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='updatejob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('product',), name='unique_active_update_job'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:57
+
+import django.db.models.deletion
+import pandas as pd
+from django.db import migrations, models
+
+
+def to_monthly_close(price_records: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates daily records, sorted by date, into the last, highest and lowest close of every month, whose months
+    are encoded into a single integer bucket (yyyymm). The aggregation is copied into the migration, so that what it
+    does never changes with the helpers of the app
+    """
+    buckets = (price_records["date"].dt.year * 100 + price_records["date"].dt.month).rename("bucket")
+    closes = \
+        price_records.groupby([price_records["product_id"], buckets]) \
+            .agg(close=("close", "last"), max_close=("close", "max"), min_close=("close", "min"),
+                 date=("date", "last")) \
+            .reset_index()
+
+    return closes
+
+
+def backfill_price_monthly(apps, schema_editor):
+    """
+    Aggregates the price records already existing in DB into the monthly close table
+    """
+    PriceRecord = apps.get_model("rankingtable", "PriceRecord")
+    PriceMonthly = apps.get_model("rankingtable", "PriceMonthly")
+
+    price_records = pd.DataFrame.from_records(
+        PriceRecord.objects.order_by("product_id", "date").values("product_id", "date", "close")
+    )
+    if price_records.empty:
+        return None
+    price_records["date"] = pd.to_datetime(price_records["date"], yearfirst=True)
+
+    PriceMonthly.objects.bulk_create(
+        (
+            PriceMonthly(bucket=month.bucket, close=month.close, max_close=month.max_close,
+                         min_close=month.min_close, date=month.date.date(), product_id=month.product_id)
+            for month in to_monthly_close(price_records).itertuples(index=False)
+        ),
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankingtable', '0011_updatejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.IntegerField()),
+                ('close', models.FloatField()),
+                ('max_close', models.FloatField()),
+                ('min_close', models.FloatField()),
+                ('date', models.DateField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='rankingtable.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pricemonthly',
+            constraint=models.UniqueConstraint(fields=('product', 'bucket'), name='unique_product_month'),
+        ),
+        migrations.RunPython(backfill_price_monthly, migrations.RunPython.noop),
+    ]
@@ -3,7 +3,7 @@ from django.db import models
 
 # Create your models here.
 class AssetClass(models.Model):
-    name = models.CharField(max_length=30)
+    name = models.CharField(max_length=30, unique=True)
 
     class Meta:
         verbose_name_plural = "Asset classes"
@@ -11,7 +11,7 @@ class AssetClass(models.Model):
 
 class Product(models.Model):
     name = models.CharField(max_length=1000, null=True)
-    symbol = models.CharField(max_length=30)
+    symbol = models.CharField(max_length=30, unique=True)
     alias = models.CharField(max_length=30, null=True)
     assetclass = models.ForeignKey(AssetClass, on_delete=models.PROTECT)
 
@@ -23,3 +23,84 @@ class PriceRecord(models.Model):
     close = models.FloatField()
     date = models.DateField()
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "date"], name="unique_product_date"),
+        ]
+        indexes = [
+            models.Index(fields=["date", "product", "close"], name="pricerecord_date_close_idx"),
+        ]
+
+
+class PriceRollup(models.Model):
+    period = models.CharField(max_length=1)
+    bucket = models.IntegerField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    first_date = models.DateField()
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "period", "bucket"], name="unique_product_period_bucket"),
+        ]
+
+
+class PriceMonthly(models.Model):
+    bucket = models.IntegerField()
+    close = models.FloatField()
+    max_close = models.FloatField()
+    min_close = models.FloatField()
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "bucket"], name="unique_product_month"),
+        ]
+
+
+class DataVersion(models.Model):
+    version = models.IntegerField(default=0)
+
+
+class ProductLatest(models.Model):
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    date = models.DateField()
+    product = models.OneToOneField(Product, on_delete=models.PROTECT)
+
+
+class IngestManifest(models.Model):
+    path = models.CharField(max_length=1024, unique=True)
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    hash = models.CharField(max_length=64)
+    offset = models.BigIntegerField()
+
+
+class UpdateJob(models.Model):
+    status = models.CharField(max_length=10, default="pending")
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True)
+    scheduled_at = models.DateTimeField()
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product"], condition=models.Q(status__in=["pending", "running"]),
+                name="unique_active_update_job"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "scheduled_at"], name="updatejob_status_idx"),
+        ]
@@ -1,3 +1,239 @@
-from django.test import TestCase
+from django.db import connection as django_connection
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from rankingtable.utils.dboperator import DbController
+from rankingtable.utils.downloader import Downloader, DownloadRequest, Fetcher
+from rankingtable.utils.metrics import MetricsCalculator, to_rollup
+from threading import Lock
+import numpy as np
+import pandas as pd
+import tempfile
+import sqlite3
+import shutil
+import time
+import os
+
+
+class StubFetcher(Fetcher):
+    """
+    Serves price records locally, failing a given number of times per alias before it succeeds
+    """
+    host = "stub"
+
+    def __init__(self, failures=None, empty=(), records=None):
+        self._lock = Lock()
+        self.failures = dict(failures or {})
+        self.empty = set(empty)
+        self.records = records
+        self.calls = list()
+
+    def fetch(self, alias: str, period=None, start_date=None, end_date=None) -> pd.DataFrame:
+        with self._lock:
+            self.calls.append((alias, time.monotonic()))
+            if self.failures.get(alias, 0) > 0:
+                self.failures[alias] -= 1
+                raise ConnectionError(f"Failed to download '{alias}'")
+
+        if alias in self.empty:
+            raise IndexError
+        if self.records is not None:
+            return self.records.copy()
+        return pd.DataFrame({
+            "Date": pd.date_range("2024-01-01", periods=3),
+            "Open": [1.0, 2.0, 3.0], "High": [1.0, 2.0, 3.0], "Low": [1.0, 2.0, 3.0], "Close": [1.0, 2.0, 3.0],
+        })
+
+
+def to_requests(*aliases) -> list:
+    return [DownloadRequest(alias, alias, "max", None, None) for alias in aliases]
+
+
+class DownloaderTests(SimpleTestCase):
+    def test_fetcher_must_implement_fetch(self):
+        with self.assertRaises(TypeError):
+            Fetcher()
+
+    def test_retries_until_success(self):
+        fetcher = StubFetcher(failures={"A": 2})
+        downloader = Downloader(fetcher, rate=0, retries=3, backoff=0)
+
+        data, = downloader.download(to_requests("A"))
+
+        self.assertEqual(len(data), 3)
+        self.assertEqual(len(fetcher.calls), 3)
+        self.assertEqual(downloader.timings[0]["attempts"], 3)
+        self.assertIsNone(downloader.timings[0]["error"])
+
+    def test_returns_none_when_every_attempt_fails(self):
+        fetcher = StubFetcher(failures={"A": 10})
+        downloader = Downloader(fetcher, rate=0, retries=2, backoff=0)
+
+        data, other = downloader.download(to_requests("A", "B"))
+
+        self.assertIsNone(data)
+        self.assertEqual(len(other), 3)
+        self.assertEqual([alias for alias, _ in fetcher.calls].count("A"), 3)
+        timing = next(timing for timing in downloader.timings if timing["symbol"] == "A")
+        self.assertEqual(timing["attempts"], 3)
+        self.assertIn("ConnectionError", timing["error"])
+
+    def test_empty_download_is_not_retried(self):
+        fetcher = StubFetcher(empty={"A"})
+        downloader = Downloader(fetcher, rate=0, retries=3, backoff=0)
+
+        data, = downloader.download(to_requests("A"))
+
+        self.assertTrue(data.empty)
+        self.assertEqual(len(fetcher.calls), 1)
+
+    def test_backs_off_exponentially(self):
+        fetcher = StubFetcher(failures={"A": 2})
+        downloader = Downloader(fetcher, rate=0, retries=2, backoff=0.05)
+
+        downloader.download(to_requests("A"))
+
+        times = [called for _, called in fetcher.calls]
+        self.assertGreaterEqual(times[1] - times[0], 0.05)
+        self.assertGreaterEqual(times[2] - times[1], 0.1)
+
+    def test_requests_to_a_host_are_rate_limited(self):
+        fetcher = StubFetcher()
+        downloader = Downloader(fetcher, workers=4, rate=20, retries=0)
+
+        downloader.download(to_requests(*"ABCDEF"))
+
+        # Requests are spaced out by 1 / rate seconds however many threads send them
+        times = sorted(called for _, called in fetcher.calls)
+        self.assertEqual(len(times), 6)
+        self.assertGreaterEqual(times[-1] - times[0], 5 / 20 * 0.95)
+
+
+def to_price_records(start_date: str, end_date: str) -> pd.DataFrame:
+    records = list()
+    for number, product in enumerate(["A", "B"]):
+        dates = pd.date_range(start_date, end_date)
+        close = 100 + number + np.sin(np.arange(len(dates)) / 5)
+        records.append(pd.DataFrame({
+            "type": "Stock", "product": product, "date": dates,
+            "open": close - 0.5, "high": close + 1, "low": close - 1, "close": close,
+        }))
+
+    return pd.concat(records, ignore_index=True)
+
+
+def to_fetched_rollups(records: pd.DataFrame, start_date: str, end_date: str) -> dict:
+    """
+    Gets the bars of the rollup table that DataReader.fetch_rollup_records returns for a date range
+    """
+    rollups = dict()
+    for period in ["w", "m", "y"]:
+        bars = to_rollup(records.copy(), period, ["type", "product"])
+        bars = bars[(bars["first_date"] >= pd.Timestamp(start_date)) & (bars["date"] <= pd.Timestamp(end_date))]
+        rollups[period] = bars[["type", "product", "bucket", "open", "high", "low", "close", "first_date", "date"]] \
+            .assign(first_date=bars["first_date"].dt.strftime("%Y-%m-%d"), date=bars["date"].dt.strftime("%Y-%m-%d"))
+
+    return rollups
+
+
+class RollupMetricsTests(SimpleTestCase):
+    def assert_rollup_matches_records(self, start_date: str, end_date: str):
+        records = to_price_records("2022-06-01", "2026-06-30")
+        rollups = to_fetched_rollups(records, start_date, end_date)
+        records = records[(records["date"] >= start_date) & (records["date"] <= end_date)]
+
+        for period in ["w", "m", "y"]:
+            with self.subTest(period=period):
+                expected = MetricsCalculator(records.copy())._transform_data_period(period)
+                merged = MetricsCalculator(records.copy(), rollups=rollups)._transform_data_period(period)
+                pd.testing.assert_frame_equal(merged[expected.columns], expected, check_dtype=False)
+
+        metrics = ["relative_change", "absolute_change", "updown_ratio", "volatility"]
+        self.assertEqual(MetricsCalculator(records.copy(), rollups=rollups).calc(metrics, ["w", "m", "y"]),
+                         MetricsCalculator(records.copy()).calc(metrics, ["w", "m", "y"]))
+
+    def test_mid_week_start_across_a_year_end(self):
+        # The last days of 2024 belong to the first ISO week of 2025, i.e. the bucket of the first week of 2024,
+        # whose bar is not fetched since it starts before the range
+        self.assert_rollup_matches_records("2024-02-07", "2025-01-15")
+
+    def test_range_ending_before_the_last_days_of_a_year(self):
+        self.assert_rollup_matches_records("2023-01-04", "2024-12-29")
+
+    def test_range_spanning_several_years(self):
+        self.assert_rollup_matches_records("2022-12-28", "2026-01-02")
+
+
+class IngestionTests(TestCase):
+    """
+    Ingests price records through a separate connection to a copy of the schema of the test DB, since the ingestion
+    commits on its own
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        # A cheap product whose early records are far below its later ones, so that they set its decimals
+        closes = np.concatenate([np.linspace(0.0051, 0.0093, 20), [0.1537, 0.1612, 0.1588, 0.1491, 0.1523]])
+        self.records = pd.DataFrame({
+            "Date": pd.bdate_range("2020-01-01", periods=len(closes)).strftime("%Y-%m-%d 00:00:00-05:00"),
+            "Open": closes * 1.01, "High": closes * 1.02, "Low": closes * 0.98, "Close": closes, "Volume": 1,
+        })
+
+    def to_connection(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(":memory:")
+        with django_connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                "ORDER BY type = 'index'"
+            )
+            for sql, in cursor.fetchall():
+                connection.execute(sql)
+        self.addCleanup(connection.close)
+
+        return connection
+
+    def write_records(self, rows: slice) -> str:
+        FILE_DIR = os.path.join(self.directory, "Crypto", "CHEAP.csv")
+        os.makedirs(os.path.dirname(FILE_DIR), exist_ok=True)
+        self.records.iloc[rows].to_csv(FILE_DIR, index=False)
+
+        return FILE_DIR
+
+    def fetch_price_records(self, connection: sqlite3.Connection) -> list:
+        return connection.execute(
+            "SELECT date, open, high, low, close FROM rankingtable_pricerecord ORDER BY date"
+        ).fetchall()
+
+    def test_incremental_ingest_rounds_like_full_ingest(self):
+        full = self.to_connection()
+        self.write_records(slice(None))
+        DbController(full).batch_insert(self.directory)
+
+        incremental = self.to_connection()
+        self.write_records(slice(0, 20))
+        DbController(incremental).batch_insert(self.directory)
+        self.write_records(slice(None))
+        DbController(incremental).batch_insert(self.directory)
+
+        records = self.fetch_price_records(full)
+        self.assertEqual(len(records), len(self.records))
+        self.assertEqual([record[-1] for record in records[-5:]], [0.1537, 0.1612, 0.1588, 0.1491, 0.1523])
+        self.assertEqual(self.fetch_price_records(incremental), records)
+
+    def test_direct_update_rounds_like_full_ingest(self):
+        full = self.to_connection()
+        self.write_records(slice(None))
+        DbController(full).batch_insert(self.directory)
+
+        direct = self.to_connection()
+        self.write_records(slice(0, 20))
+        controller = DbController(direct)
+        controller.batch_insert(self.directory)
+
+        # The downloaded records are inserted straight into DB, without being appended to the CSV file
+        downloaded = self.records.iloc[20:].assign(Date=lambda data: pd.to_datetime(data["Date"]))
+        downloader = Downloader(StubFetcher(records=downloaded), rate=0, retries=0)
+        controller.update_products(controller.fetch_records("latest date"), self.directory, downloader,
+                                   direct=True, archive=False, end_date=pd.Timestamp("2020-03-02").date())
+
+        self.assertEqual(self.fetch_price_records(direct), self.fetch_price_records(full))
@@ -0,0 +1,255 @@
+from rankingtable.utils.metrics import MetricsCalculator
+from rankingtable.utils.dboperator import DataNormalization
+from analysis.utils.dboperator import DataNormalization as ReleaseDataNormalization
+
+from datetime import datetime
+import tracemalloc
+import platform
+import time
+import json
+import numpy as np
+import pandas as pd
+
+
+# Number of products and years of daily records of every scale
+SCALES = {
+    "tiny": (50, 1),
+    "small": (200, 3),
+    "medium": (1000, 5),
+    "large": (2000, 10),
+    "full": (5000, 15),
+}
+METRICS = ["relative_change", "absolute_change", "updown_ratio", "volatility", "expected_return"]
+PERIODS = ["d", "w", "m", "y"]
+ASSET_CLASSES = ["Stock", "Index", "Commodity", "Currency", "Cryptocurrency"]
+
+# Number of raw rows to be normalized at every size
+ROWS = [1000, 10000, 100000]
+
+
+def generate_price_records(products: int, years: int, seed=0, end_date="2024-12-31") -> pd.DataFrame:
+    """
+    Generates reproducible daily OHLC records of a number of products, whose closing prices follow geometric
+    Brownian motions over a number of years of business days
+    Parameters:
+        products: int
+            The number of products
+        years: int
+            The number of years of daily records of every product
+        seed: int
+            The seed of the random number generator, the same seed always generates the same records
+        end_date: str
+            The date of the last record of every product
+    Returns:
+        pd.DataFrame
+            A DataFrame of the same columns as the price records fetched from DB
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end_date, periods=years * 252)
+    days = len(dates)
+
+    # Every product has its own initial price, drift and volatility
+    initial_prices = rng.uniform(1, 1000, size=(products, 1))
+    drifts = rng.normal(0.0003, 0.0005, size=(products, 1))
+    volatilities = rng.uniform(0.005, 0.04, size=(products, 1))
+    log_returns = drifts + volatilities * rng.standard_normal(size=(products, days))
+    close = initial_prices * np.exp(np.cumsum(log_returns, axis=1))
+
+    # Opens near the previous close, highs and lows lie beyond both the open and the close
+    previous_close = np.concatenate([initial_prices, close[:, :-1]], axis=1)
+    opens = previous_close * (1 + rng.normal(0, 0.002, size=(products, days)))
+    highs = np.maximum(opens, close) * (1 + np.abs(rng.normal(0, 0.005, size=(products, days))))
+    lows = np.minimum(opens, close) * (1 - np.abs(rng.normal(0, 0.005, size=(products, days))))
+
+    names = np.array([f"Product {i}" for i in range(products)], dtype=object)
+    symbols = np.array([f"P{i}" for i in range(products)], dtype=object)
+    types = np.array([ASSET_CLASSES[i % len(ASSET_CLASSES)] for i in range(products)], dtype=object)
+
+    return pd.DataFrame({
+        "type": np.repeat(types, days),
+        "product": np.repeat(names, days),
+        "symbol": np.repeat(symbols, days),
+        "date": np.tile(dates.values, products),
+        "open": opens.ravel().round(2),
+        "high": highs.ravel().round(2),
+        "low": lows.ravel().round(2),
+        "close": close.ravel().round(2),
+    })
+
+
+def time_metric(records: pd.DataFrame, metric: str, period: str) -> float:
+    """
+    Times the calculation of a metric on a period, including the transformation of the dataset into that period
+    Parameters:
+        records: pd.DataFrame
+            The daily price records
+        metric: str
+            The metric to be calculated
+        period: str
+            The period in which the metric is calculated
+    Returns:
+        float
+            The elapsed time in seconds
+    """
+    calculator = MetricsCalculator(records.copy())
+
+    start = time.perf_counter()
+    calculator.calc([metric], [period])
+
+    return time.perf_counter() - start
+
+
+def trace_metric(records: pd.DataFrame, metric: str, period: str) -> int:
+    """
+    Records the peak memory allocated during the calculation of a metric on a period. Memory is traced in a separate
+    run, since tracing slows down every allocation and would distort the timings
+    Parameters:
+        records: pd.DataFrame
+            The daily price records
+        metric: str
+            The metric to be calculated
+        period: str
+            The period in which the metric is calculated
+    Returns:
+        int
+            The peak memory in bytes
+    """
+    calculator = MetricsCalculator(records.copy())
+
+    tracemalloc.start()
+    calculator.calc([metric], [period])
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak_memory
+
+
+def run(scales: list, metrics=METRICS, periods=PERIODS, repeat=1, seed=0) -> dict:
+    """
+    Runs the benchmark of every metric on every period at every scale
+    Parameters:
+        scales: list
+            The names of the scales, as in SCALES
+        metrics: list
+            The metrics to be benchmarked
+        periods: list
+            The periods to be benchmarked
+        repeat: int
+            The number of runs of every benchmark, the fastest one is kept
+        seed: int
+            The seed of the synthetic records
+    Returns:
+        dict
+            The environment and the results of the benchmark, ready to be serialized to JSON
+    """
+    results = list()
+    for scale in scales:
+        products, years = SCALES[scale]
+        records = generate_price_records(products, years, seed)
+
+        for period in periods:
+            for metric in metrics:
+                seconds = min(time_metric(records, metric, period) for _ in range(repeat))
+                results.append({
+                    "scale": scale, "products": products, "years": years, "rows": len(records),
+                    "metric": metric, "period": period, "seconds": round(seconds, 6),
+                    "peak_memory_bytes": trace_metric(records, metric, period),
+                })
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def generate_raw_records(rows: int, seed=0, end_date="2024-12-31") -> dict:
+    """
+    Generates reproducible raw records of both the price and the release data inputs, formatted as they are read
+    from the CSV files, i.e. dates are strings and prices are not yet rounded. Records are daily and belong to a
+    single product or headline, as in a CSV file
+    Parameters:
+        rows: int
+            The number of rows of every input, dates can span up to about 130,000 days
+        seed: int
+            The seed of the random number generator
+        end_date: str
+            The date of the last record
+    Returns:
+        dict
+            A DataFrame of raw records of every input
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end_date, periods=rows, freq="D")
+    close = rng.uniform(1, 1000) * np.exp(np.cumsum(rng.normal(0.0003, 0.02, size=rows)))
+
+    prices = pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d 00:00:00-05:00"),
+        "Open": close * (1 + rng.normal(0, 0.002, size=rows)),
+        "High": close * (1 + np.abs(rng.normal(0, 0.005, size=rows))),
+        "Low": close * (1 - np.abs(rng.normal(0, 0.005, size=rows))),
+        "Close": close,
+    })
+    release_data = pd.DataFrame({
+        "date": dates.strftime("%d/%m/%Y"),
+        "value": rng.normal(size=rows),
+    })
+
+    return {"price": prices, "release data": release_data}
+
+
+def run_normalization(rows=ROWS, repeat=1, seed=0) -> dict:
+    """
+    Runs the throughput benchmark of the normalization of raw price records and release data
+    Parameters:
+        rows: list
+            The numbers of raw rows to be normalized
+        repeat: int
+            The number of runs of every benchmark, the fastest one is kept
+        seed: int
+            The seed of the synthetic records
+    Returns:
+        dict
+            The environment and the results of the benchmark, ready to be serialized to JSON
+    """
+    normalizers = {"price": DataNormalization, "release data": ReleaseDataNormalization}
+
+    results = list()
+    for size in rows:
+        raw_records = generate_raw_records(size, seed)
+        start_date = pd.Timestamp.min.ceil("D").strftime("%Y-%m-%d")
+        for name, normalizer in normalizers.items():
+            timings = list()
+            for _ in range(repeat):
+                data = raw_records[name].copy()
+                start = time.perf_counter()
+                normalizer(data).clean(default_start_date=start_date)
+                timings.append(time.perf_counter() - start)
+
+            seconds = min(timings)
+            results.append({
+                "input": name, "rows": size, "seconds": round(seconds, 6),
+                "rows_per_second": round(size / seconds) if seconds else None,
+            })
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def save(report: dict, output: str) -> None:
+    """
+    Saves the benchmark report as a JSON file
+    """
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
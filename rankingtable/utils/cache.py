@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import pickle
+import shutil
+import os
+
+
+class MetricsCache:
+    """
+    Caches calculation results in a bounded LRU in memory and, optionally, in a directory shared by every worker
+    process. Results are stored under the version of the data they were calculated from, entries of older versions
+    are evicted as soon as a newer version is seen. Results are kept pickled, so that every caller gets its own copy
+    and a cached result can never be changed by the caller that mutates it.
+    """
+    def __init__(self, max_entries=128, directory=""):
+        self._lock = Lock()
+        self.max_entries = max_entries
+        self.directory = directory
+        self.version = None
+        self.entries = OrderedDict()
+
+    def _to_path(self, key: tuple, version: int) -> str:
+        """
+        Gets the path of the file in which a result is stored in the shared directory
+        Parameters:
+            key: tuple
+                The arguments from which the result is calculated
+            version: int
+                The version of the data from which the result is calculated
+        Returns:
+            str
+                The file path
+        """
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, str(version), digest + ".pickle")
+
+    def _evict(self, version: int) -> None:
+        """
+        Removes every entry that belongs to a data version older than the given one
+        Parameters:
+            version: int
+                The current data version
+        Returns:
+            None
+                Directly affects the cache
+        """
+        if self.version is not None and version <= self.version:
+            return None
+
+        self.entries.clear()
+        self.version = version
+
+        if self.directory and os.path.isdir(self.directory):
+            for folder in os.listdir(self.directory):
+                if folder.isdigit() and int(folder) < version:
+                    shutil.rmtree(os.path.join(self.directory, folder), ignore_errors=True)
+
+    def get(self, key: tuple, version: int):
+        """
+        Gets a cached result
+        Parameters:
+            key: tuple
+                The arguments from which the result is calculated
+            version: int
+                The current data version
+        Returns:
+            The cached result, None if there is none
+        """
+        with self._lock:
+            self._evict(version)
+            data = self.entries.get((version, key))
+            if data is not None:
+                self.entries.move_to_end((version, key))
+        if data is not None:
+            return pickle.loads(data)
+
+        if self.directory:
+            try:
+                with open(self._to_path(key, version), "rb") as file:
+                    data = file.read()
+                value = pickle.loads(data)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                return None
+            self._set_memory(key, version, data)
+            return value
+
+        return None
+
+    def _set_memory(self, key: tuple, version: int, data: bytes) -> None:
+        """
+        Stores a pickled result in memory, the least recently used one is discarded when the cache is full
+        """
+        with self._lock:
+            self.entries[(version, key)] = data
+            self.entries.move_to_end((version, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def set(self, key: tuple, version: int, value) -> None:
+        """
+        Stores a result in memory and in the shared directory, if any
+        Parameters:
+            key: tuple
+                The arguments from which the result is calculated
+            version: int
+                The version of the data from which the result is calculated
+            value:
+                The result
+        Returns:
+            None
+                Directly affects the cache
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._evict(version)
+        self._set_memory(key, version, data)
+
+        if self.directory:
+            # Writes to a temporary file first, so that other processes never read a partially written one
+            path = self._to_path(key, version)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+from threading import Lock, RLock, current_thread, local
+import sqlite3
+import os
+
+
+# The pragmas of every connection, journal_mode is persistent, so that setting it is a no-op once the database
+# is in WAL mode. Readers map the database file into memory, keep a larger page cache and are not allowed to write
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+READER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "mmap_size": "268435456",
+    "cache_size": "-65536",
+    "temp_store": "MEMORY",
+    "query_only": "ON",
+}
+
+
+class ConnectionManager:
+    """
+    Keeps the connections to a database alive across requests: every thread has its own read connection, while
+    every write goes through a single writer connection. Since the database is in WAL mode, readers see the last
+    committed data and are never blocked by the writer.
+    """
+    def __init__(self, path: str, timeout=30.0, reader_pragmas=None, writer_pragmas=None):
+        self.path = path
+        self.timeout = timeout
+        self.reader_pragmas = READER_PRAGMAS if reader_pragmas is None else reader_pragmas
+        self.writer_pragmas = WRITER_PRAGMAS if writer_pragmas is None else writer_pragmas
+
+        self._local = local()
+        self._lock = Lock()
+        self._readers = dict()
+        self._writer = None
+        self._writer_lock = RLock()
+
+    def _connect(self, pragmas: dict) -> sqlite3.Connection:
+        """
+        Opens a connection to the database with the given pragmas, connections are only used by one thread at a
+        time but might be closed by another one
+        """
+        connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        for pragma, value in pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+
+        return connection
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        Gets the read connection of the calling thread, which is opened on first use and then reused
+        Returns:
+            sqlite3.Connection
+                A connection on which every write is rejected
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect(self.reader_pragmas)
+            self._local.connection = connection
+            with self._lock:
+                # Threads might be started per request, the connections of those that have ended are closed
+                for thread in [thread for thread in self._readers if not thread.is_alive()]:
+                    self._readers.pop(thread).close()
+                self._readers[current_thread()] = connection
+
+        return connection
+
+    def _get_writer(self) -> sqlite3.Connection:
+        """
+        Gets the writer connection, which is opened on first use
+        """
+        if self._writer is None:
+            self._writer = self._connect(self.writer_pragmas)
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """
+        Lends the writer connection to the calling thread, other threads wait until it is returned. Changes are
+        committed when the block exits, and rolled back if an exception is raised
+        Returns:
+            sqlite3.Connection
+                The writer connection
+        """
+        with self._writer_lock:
+            connection = self._get_writer()
+            try:
+                yield connection
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+
+    def close(self) -> None:
+        """
+        Closes every connection, those of other threads must no longer be in use
+        """
+        with self._lock:
+            for connection in self._readers.values():
+                connection.close()
+            self._readers = dict()
+        self._local = local()
+
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_managers = dict()
+_managers_lock = Lock()
+
+
+def get_connection_manager(path: str) -> ConnectionManager:
+    """
+    Gets the connection manager of a database, which is shared by the whole process
+    Parameters:
+        path: str
+            The directory of the database file
+    Returns:
+        ConnectionManager
+            The manager of the connections to the database
+    """
+    path = os.path.abspath(path)
+    with _managers_lock:
+        if path not in _managers:
+            _managers[path] = ConnectionManager(path)
+        return _managers[path]
@@ -1,8 +1,17 @@
+from rankingtable.utils.metrics import to_monthly_close, to_rollup
+from rankingtable.utils.pricestore import price_store
+from rankingtable.utils.manifest import IngestManifest, is_unchanged, read_new_rows, scan_file
+from rankingtable.utils.downloader import Downloader, DownloadRequest
+from rankingtable.utils.tradingcalendar import trading_calendars
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
-import yfinance as yf
+import numpy as np
 import pandas as pd
 import sqlite3
+import csv
 import os
 
 
@@ -10,10 +19,21 @@ class DbAdapter:
     """
     Provides functionalities to insert different types of data into DB
     """
-    def __init__(self, connection: sqlite3.Connection):
+    def __init__(self, connection: sqlite3.Connection, autocommit=True):
         self.connection = connection
         self.cursor = connection.cursor()
 
+        # When autocommit is disabled, inserted records are only committed once the caller commits the connection,
+        # and the rollup and latest record tables are only updated by flush, once for all the pending records
+        self.autocommit = autocommit
+        self.pending_records = list()
+
+    def _transaction(self):
+        """
+        Gets the context in which records are written, which commits them on exit unless autocommit is disabled
+        """
+        return self.connection if self.autocommit else nullcontext()
+
     def _validate_data_format(self, table: str, data) -> Exception:
         """
         Checks if the types of data are of correct ones
@@ -67,76 +87,39 @@ class DbAdapter:
             if self.cursor.fetchone()[0] is None:
                 raise Exception(f"The specified product '{data.name}' does not exist in DB")
 
-    def _remove_existing_records(self, table: str, data: list or pd.DataFrame) -> list or pd.DataFrame:
+    def _remove_existing_records(self, table: str, data: pd.DataFrame) -> pd.DataFrame:
         """
-        Removes records that are the duplicates of those in DB
+        Removes price records that are not newer than those in DB, duplicates of asset classes and products
+        are skipped by the UNIQUE constraints of their tables upon insertion instead
             table:
                 The name of the DB table, into which data is to be inserted
-            data: list or DataFrame
+            data: DataFrame
                 The dataset
         Returns:
-            list
-                A list of tuples containing either new product or new asset class records
             DataFrame
                 A DataFrame containing new price records
         """
-        if table == "price record":
-            product_id = \
-                self.cursor.execute(
-                    "SELECT id FROM rankingtable_product WHERE symbol = ?", (data.name,)
-                ).fetchone()[0]
-
-            # Insert only the records whose dates are newer than those existing in DB
-            last_existing_date = \
-                self.cursor.execute(
-                    "SELECT MAX(date) FROM rankingtable_pricerecord WHERE product_id = ?", (product_id,)
-                ).fetchone()
-
-            # Skip this step if the records of a particular product haven't been inserted yet
-            if last_existing_date[0]:
-                last_existing_date = pd.to_datetime(last_existing_date[0], yearfirst=True).date()
-                data = data.query("date > @last_existing_date")
-
-            return data
-        else:
-            query_dict = {
-                "asset class": "SELECT name FROM rankingtable_assetclass",
-                "product": "SELECT symbol FROM rankingtable_product",
-            }
-            existing_records = self.cursor.execute(query_dict[table]).fetchall()
-            existing_records = list(map(lambda record: record[0], existing_records))
+        product_id = \
+            self.cursor.execute(
+                "SELECT id FROM rankingtable_product WHERE symbol = ?", (data.name,)
+            ).fetchone()[0]
 
-            # Pick records that are new into a list
-            nonexisting_records = list()
-            for record in data:
-                if record not in existing_records:
-                    nonexisting_records.append(record)
+        # Insert only the records whose dates are newer than those existing in DB
+        last_existing_date = \
+            self.cursor.execute(
+                "SELECT date FROM rankingtable_productlatest WHERE product_id = ?", (product_id,)
+            ).fetchone()
 
-            return nonexisting_records
+        # Skip this step if the records of a particular product haven't been inserted yet
+        if last_existing_date:
+            last_existing_date = pd.to_datetime(last_existing_date[0], yearfirst=True)
+            data = data[pd.to_datetime(data["date"], yearfirst=True) > last_existing_date]
 
-    def _get_last_index(self, table: str) -> int:
-        """
-        Gets the last index of a table in DB, new data must be concatenated from the tail of the dataset
-        Parameters:
-            table: str
-                The name of the DB table, into which data is to be inserted
-        Returns:
-            int
-                The index of the last record in a table, 0 if the table is empty
-        """
-        query_dict = {
-            "asset class": "SELECT id FROM rankingtable_assetclass ORDER BY id DESC LIMIT 1",
-            "product": "SELECT id FROM rankingtable_product ORDER BY id DESC LIMIT 1",
-            "price record": "SELECT id FROM rankingtable_pricerecord ORDER BY id DESC LIMIT 1",
-        }
-        last_index = self.cursor.execute(query_dict[table]).fetchone()
-        last_index = last_index[0] if last_index else 0
-
-        return last_index
+        return data
 
     def _insert_asset_class(self, table: str, asset_classes: list) -> None:
         """
-        Inserts asset class data into DB
+        Inserts asset class data into DB, skipping those that already exist
         Parameters:
             table: str
                 The name of the DB table, into which data is to be inserted
@@ -146,22 +129,14 @@ class DbAdapter:
             None
                 Data is inserted directly into DB
         """
-        # Reconstruct the dataset with only non-existing records
-        asset_classes = self._remove_existing_records(table, asset_classes)
-        if len(asset_classes) < 1:
-            return None
-
-        # Transform the dataset into the appropriate format, ready for db-insertion
-        asset_classes = pd.DataFrame({"name": asset_classes}).reset_index(names=["id"])
-
-        # New records must continue from the last index
-        asset_classes["id"] = asset_classes["id"] + 1 + self._get_last_index(table)
-
-        asset_classes.to_sql(name="rankingtable_assetclass", con=self.connection, if_exists="append", index=False)
+        self.cursor.executemany("""
+            INSERT INTO rankingtable_assetclass (name) VALUES (?)
+            ON CONFLICT (name) DO NOTHING
+        """, [(asset_class, ) for asset_class in asset_classes])
 
     def _insert_product(self, table: str, products: pd.Series) -> None:
         """
-        Inserts product data into DB
+        Inserts product data into DB, skipping those that already exist
         Parameters:
             table: str
                 The name of the DB table, into which data is to be inserted
@@ -171,30 +146,20 @@ class DbAdapter:
             None
                 Data is inserted directly into DB
         """
-        # Reconstruct the dataset with only non-existing records
-        asset_class = products.name
-        products = pd.Series(self._remove_existing_records(table, products.values))
-        products.name = asset_class
-        if len(products) < 1:
-            return None
-
-        # Transform the dataset into the appropriate format, ready for db-insertion
-        products = products.reset_index().rename(columns={"index": "id", f"{asset_class}": "symbol"})
-
-        # New records must continue from the last index
-        products["id"] = products["id"] + 1 + self._get_last_index(table)
-
-        # Find and insert the corresponding foreign key
-        products["assetclass_id"] = \
+        # Find the corresponding foreign key
+        assetclass_id = \
             self.cursor.execute(
-                "SELECT id FROM rankingtable_assetclass WHERE name = ?", (asset_class, )
+                "SELECT id FROM rankingtable_assetclass WHERE name = ?", (products.name, )
             ).fetchone()[0]
 
-        products.to_sql(name="rankingtable_product", con=self.connection, if_exists="append", index=False)
+        self.cursor.executemany("""
+            INSERT INTO rankingtable_product (symbol, assetclass_id) VALUES (?, ?)
+            ON CONFLICT (symbol) DO NOTHING
+        """, [(symbol, assetclass_id) for symbol in products.values])
 
     def _insert_price_record(self, table: str, price_records: pd.DataFrame) -> None:
         """
-        Inserts price data into DB
+        Inserts price data into DB, skipping those that already exist
         Parameters:
             table: str
                 The name of the DB table, into which data is to be inserted
@@ -204,28 +169,160 @@ class DbAdapter:
             None
                 Data is inserted directly into DB
         """
-        # Reconstruct the dataset with only non-existing records
+        # Reconstruct the dataset with only records newer than those in DB
         product = price_records.name
         price_records = self._remove_existing_records(table, price_records)
         if len(price_records) < 1:
             return None
 
-        # Transform the dataset into the appropriate format, ready for db-insertion
-        price_records = price_records.reset_index(names=["id"])
-
-        if price_records.loc[0, "id"] > 0:
-            price_records["id"] -= price_records["id"].min()
-
-        # New records must continue from the last index
-        price_records["id"] = price_records["id"] + 1 + self._get_last_index(table)
-
         # Find and insert the corresponding foreign key
+        price_records = price_records.reset_index(drop=True)
         price_records["product_id"] = \
             self.cursor.execute(
                 "SELECT id FROM rankingtable_product WHERE symbol = ?", (product, )
             ).fetchone()[0]
 
-        price_records.to_sql(name="rankingtable_pricerecord", con=self.connection, if_exists="append", index=False)
+        # The records, the bars of the rollup table and the latest record of the product are written
+        # in the transaction of insert_into, so that they never disagree with each other
+        price_records["date"] = pd.to_datetime(price_records["date"], yearfirst=True).dt.strftime("%Y-%m-%d")
+        self.cursor.executemany("""
+            INSERT INTO rankingtable_pricerecord (date, open, high, low, close, product_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (product_id, date) DO NOTHING
+        """, price_records[["date", "open", "high", "low", "close", "product_id"]] \
+                .itertuples(index=False, name=None))
+        if self.autocommit:
+            self._update_price_rollup(price_records)
+            self._update_price_monthly(price_records)
+            self._update_product_latest(price_records)
+        else:
+            self.pending_records.append(price_records)
+
+    def flush(self) -> None:
+        """
+        Updates the rollup, monthly close and latest record tables with all the price records inserted since the last
+        flush, which must be called before the connection is committed when autocommit is disabled
+        Parameters:
+            None
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        if not self.pending_records:
+            return None
+
+        price_records = \
+            pd.concat(self.pending_records, ignore_index=True) \
+                .drop_duplicates(subset=["product_id", "date"])
+        self._update_price_rollup(price_records)
+        self._update_price_monthly(price_records)
+        self._update_product_latest(price_records)
+        self.pending_records = list()
+
+    def _update_price_rollup(self, price_records: pd.DataFrame) -> None:
+        """
+        Incrementally updates the weekly, monthly and yearly bars of the rollup table with new price records, which
+        must be dated after all the records of the same products that already exist in DB
+        Parameters:
+            price_records: DataFrame
+                A DataFrame containing new price records and the ids of their products
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        price_records = price_records[["product_id", "date", "open", "high", "low", "close"]].copy()
+        price_records["date"] = pd.to_datetime(price_records["date"], yearfirst=True)
+
+        rows = list()
+        for period in ["w", "m", "y"]:
+            bars = to_rollup(price_records, period, ["product_id"])
+            bars["period"] = period
+            bars["first_date"] = bars["first_date"].dt.strftime("%Y-%m-%d")
+            bars["date"] = bars["date"].dt.strftime("%Y-%m-%d")
+            rows.extend(
+                bars[["period", "bucket", "open", "high", "low", "close", "first_date", "date", "product_id"]] \
+                    .itertuples(index=False, name=None)
+            )
+
+        # New records extend the existing bar of their period, or create a new one
+        self.cursor.executemany("""
+            INSERT INTO rankingtable_pricerollup
+                (period, bucket, open, high, low, close, first_date, date, product_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (product_id, period, bucket) DO UPDATE SET
+                high = MAX(high, excluded.high),
+                low = MIN(low, excluded.low),
+                close = excluded.close,
+                date = excluded.date
+            WHERE excluded.date > rankingtable_pricerollup.date
+        """, rows)
+
+    def _update_price_monthly(self, price_records: pd.DataFrame) -> None:
+        """
+        Incrementally updates the monthly close table with new price records, which must be dated after all
+        the records of the same products that already exist in DB
+        Parameters:
+            price_records: DataFrame
+                A DataFrame containing new price records and the ids of their products
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        price_records = price_records[["product_id", "date", "close"]].copy()
+        price_records["date"] = pd.to_datetime(price_records["date"], yearfirst=True)
+        closes = to_monthly_close(price_records.sort_values(by=["product_id", "date"]), ["product_id"])
+        closes["date"] = closes["date"].dt.strftime("%Y-%m-%d")
+
+        # New records extend the existing month, or create a new one
+        self.cursor.executemany("""
+            INSERT INTO rankingtable_pricemonthly (bucket, close, max_close, min_close, date, product_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (product_id, bucket) DO UPDATE SET
+                close = excluded.close,
+                max_close = MAX(max_close, excluded.max_close),
+                min_close = MIN(min_close, excluded.min_close),
+                date = excluded.date
+            WHERE excluded.date > rankingtable_pricemonthly.date
+        """, closes[["bucket", "close", "max_close", "min_close", "date", "product_id"]] \
+                .itertuples(index=False, name=None))
+
+    def _update_product_latest(self, price_records: pd.DataFrame) -> None:
+        """
+        Replaces the latest record of every product with the most recent one of the new price records
+        Parameters:
+            price_records: DataFrame
+                A DataFrame containing new price records, whose dates are formatted as yyyy-mm-dd, and the ids
+                of their products
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        latest_records = price_records.sort_values(by=["date"]).groupby(["product_id"]).tail(1)
+        self.cursor.executemany("""
+            INSERT INTO rankingtable_productlatest (product_id, date, open, high, low, close)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (product_id) DO UPDATE SET
+                date = excluded.date,
+                open = excluded.open,
+                high = excluded.high,
+                low = excluded.low,
+                close = excluded.close
+            WHERE excluded.date > rankingtable_productlatest.date
+        """, latest_records[["product_id", "date", "open", "high", "low", "close"]] \
+                .itertuples(index=False, name=None))
+
+    def _bump_data_version(self) -> None:
+        """
+        Increments the version of the data in DB, which is part of the keys of cached calculation results
+        Parameters:
+            None
+        Returns:
+            None
+                Data is updated directly into DB
+        """
+        self.cursor.execute("UPDATE rankingtable_dataversion SET version = version + 1")
+        if self.cursor.rowcount < 1:
+            self.cursor.execute("INSERT INTO rankingtable_dataversion (id, version) VALUES (1, 1)")
 
     def insert_into(self, table: str, data: list or pd.Series or pd.DataFrame) -> None:
         """
@@ -250,7 +347,65 @@ class DbAdapter:
         if table != "asset class":
             self._validate_data_attribute(table, data)
 
-        method_dict[table](table, data)
+        # Cached calculation results become stale once any new record is inserted, the version is bumped in the
+        # same transaction as the records, so that it is never committed without them or the other way around
+        with self._transaction():
+            total_changes = self.connection.total_changes
+            method_dict[table](table, data)
+            if self.connection.total_changes > total_changes:
+                self._bump_data_version()
+
+
+# The formats of the date strings in raw data, day-first formats are tried when dates are not year-first
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"]
+
+
+def to_date_strings(dates: pd.Series) -> pd.Series:
+    """
+    Gets the date parts of date-time strings, which are the parts before the first whitespace. Since the date part
+    usually has the same length in every row, the strings are cut at once as a fixed-width array when the
+    character following the date part of every row is a whitespace, and are split one by one otherwise
+    Parameters:
+        dates: pd.Series
+            The date-time strings
+    Returns:
+        pd.Series
+            The date strings
+    """
+    strings = dates.to_numpy(dtype=str)
+    first_parts = strings[0].split(maxsplit=1) if len(strings) else list()
+    length = len(first_parts[0]) if first_parts else 0
+    width = strings.dtype.itemsize // 4
+
+    if 0 < length and strings[0].startswith(first_parts[0]):
+        # Unicode code points of the strings, which are padded with zeros up to the width of the array
+        code_points = strings.view(np.uint32).reshape(len(strings), width)
+        whitespaces = [9, 10, 11, 12, 13, 32]
+        if not np.isin(code_points[:, :length], whitespaces).any() \
+                and (length == width or np.isin(code_points[:, length], whitespaces + [0]).all()):
+            return pd.Series(strings.astype(f"<U{length}"), index=dates.index)
+
+    return pd.Series(strings, index=dates.index).str.split(n=1).str.get(0)
+
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    """
+    Transforms date strings into datetime64 values, every explicit format is tried in turn on the whole
+    column before the format is inferred, with the day first
+    Parameters:
+        dates: pd.Series
+            The date strings
+    Returns:
+        pd.Series
+            The dates
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            return pd.to_datetime(dates, format=date_format)
+        except ValueError:
+            continue
+
+    return pd.to_datetime(dates, dayfirst=True)
 
 
 class DataNormalization:
@@ -282,8 +437,8 @@ class DataNormalization:
 
     def _normalize_date(self, default_start_date="2010-01-01") -> None:
         """
-        Slices the dataset to begin from a specified date, then transforms strings into DateTime
-        objects, but only retains the date part.
+        Slices the dataset to begin from a specified date, then transforms strings into datetime64 values,
+        but only retains the date part.
         Parameters:
             default_start_date: str
                 The begin of the slice of the dataset to be retained
@@ -291,21 +446,16 @@ class DataNormalization:
             None
                 Directly affects the original dataset
         """
-        default_start_date = pd.to_datetime(default_start_date, yearfirst=True, utc=True).date()
-
-        # Since the raw date column often contains both date and time
-        self.data.loc[:, "date"] = self.data["date"].str.split().str.get(0)
-
-        # Convert date stings into datetime objects
-        try:
-            # Check if a date string is of yyyy-mm-dd format
-            datetime.strptime(self.data.loc[0, "date"], "%Y-%m-%d")
-            self.data.loc[:, "date"] = pd.to_datetime(self.data["date"], yearfirst=True, utc=True).dt.date
-        except ValueError:
-            self.data.loc[:, "date"] = pd.to_datetime(self.data["date"], dayfirst=True, utc=True).dt.date
+        # Since the raw date column often contains both date and time, only the date part is parsed
+        dates = self.data["date"]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = parse_dates(to_date_strings(dates))
+        elif dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        self.data = self.data.assign(date=dates.dt.normalize())
 
         # Retain only records that are dated from the default_start_date onwards
-        self.data = self.data.query("date >= @default_start_date")
+        self.data = self.data[self.data["date"] >= pd.Timestamp(default_start_date)]
 
     def _normalize_data_order(self) -> None:
         """
@@ -316,10 +466,10 @@ class DataNormalization:
             None
                 Directly affects the original dataset
         """
-        self.data = self.data.sort_values(by=["date"])
+        self.data = self.data.sort_values(by=["date"], kind="stable")
         self.data = self.data.reset_index(drop=True)
 
-    def _normalize_data_format(self, numeric_type_columns: list) -> None:
+    def _normalize_data_format(self, numeric_type_columns: list, extremes=None) -> None:
         """
         Transforms numeric data by nature but is currenty formatted as strings into numpy.float64,
         which is also the format of other numeric data in the current DB. Afther the data type conversion,
@@ -327,36 +477,42 @@ class DataNormalization:
         Parameters:
             numeric_type_columns: list
                 The names of the columns containing numerical data
+            extremes: tuple
+                The minimums and maximums of the columns among the records of the product that already exist in DB,
+                see DataReader.fetch_price_extremes, None if there are none
         Returns:
             None
                 Directly affects the original dataset
         """
-        # In case data is supposed to be numbers but was incorrectly formatted
-        numeric_data = self.data.select_dtypes("number")
-
-        if numeric_data.empty:
-            for column in numeric_type_columns:
-                if column not in self.data.columns:
-                    raise Exception(f"Invalid column name '{column}'")
-                self.data.loc[:, column] = self.data[column].str.split(",").str.join("")
-                self.data.loc[:, column] = self.data[column].str.split(" ").str.join("")
-
-        # Change the data types of columns to be the same to those in DB, should they be manually inserted
-        for column in numeric_data.columns:
-            self.data[column].astype("float64")
-
-            # Round up the decimals to the appropriate nth place
-            series = self.data[column].copy()
-            for pow in range(6):
-                series_min = series.min().astype("int16")
-                series_max = series.max().astype("int16")
-                if (series_min >= 1) or (series_min <= 1 and series_max >= 20):
-                    self.data.loc[:, column] = series.round(decimals=2).where(series != 0, pd.NA)
-                    break
-
-                # For super small valued products
-                if (series.min() * 10 ** pow) < 1:
-                    self.data.loc[:, column] = series.round(decimals=abs(pow + 2)).where(series != 0, pd.NA)
+        for column in numeric_type_columns:
+            if column not in self.data.columns:
+                raise Exception(f"Invalid column name '{column}'")
+
+        # In case data is supposed to be numbers but was incorrectly formatted, thousands separators
+        # and spaces are removed and the strings are parsed in a single pass
+        numbers = self.data[numeric_type_columns]
+        numbers = numbers.apply(
+            lambda column: column if pd.api.types.is_numeric_dtype(column)
+            else pd.to_numeric(column.astype(str).str.replace(r"[,\s]", "", regex=True), errors="coerce")
+        ).astype("float64")
+        if numbers.empty:
+            self.data = self.data.assign(**numbers)
+            return None
+
+        # Round up the decimals to the 2nd place, or to a further place for super small valued products,
+        # which is the number of powers of ten (up to 10 ** 5) that still leave the minimum below 1, plus 1
+        # The records that already exist in DB are taken into account, so that the records of a product are rounded
+        # to the same place whether they are inserted at once or a few at a time
+        minimums = numbers.min().to_numpy()
+        maximums = numbers.max().to_numpy()
+        if extremes is not None:
+            minimums = np.fmin(minimums, extremes[0])
+            maximums = np.fmax(maximums, extremes[1])
+        small_powers = (minimums[:, None] * 10.0 ** np.arange(6) < 1).sum(axis=1)
+        decimals = np.where((minimums >= 1) | (maximums >= 20), 2, small_powers + 1)
+
+        numbers = numbers.round(dict(zip(numbers.columns, decimals.tolist()))).mask(numbers == 0)
+        self.data = self.data.assign(**numbers)
 
     def _remove_duplicates(self) -> None:
         """
@@ -381,11 +537,15 @@ class DataNormalization:
         if self.data.isnull().values.any():
             self.data = self.data.dropna(how="any")
 
-    def clean(self, default_start_date="2010-01-01") -> pd.DataFrame:
+    def clean(self, default_start_date="2010-01-01", extremes=None) -> pd.DataFrame:
         """
         Calls a specific sequence of methods to normalize the dataset
         Parameters:
-            None
+            default_start_date: str
+                The date from which records are retained
+            extremes: tuple
+                The minimums and maximums of the OHLC columns among the existing records of the product, by which
+                the decimals are rounded, see _normalize_data_format
         Returns:
             DataFrame
                 The normalzied version of the original dataset
@@ -393,7 +553,7 @@ class DataNormalization:
         self._normalize_columns(["date", "open", "high", "low", "close"])
         self._normalize_date(default_start_date)
         self._normalize_data_order()
-        self._normalize_data_format(["open", "high", "low", "close"])
+        self._normalize_data_format(["open", "high", "low", "close"], extremes)
         self._remove_duplicates()
         self._handle_missing_data()
 
@@ -446,14 +606,111 @@ class DataReader:
 
         return self.cursor.fetchall()
 
-    def fetch_price_records(self, start_date: str, end_date: str, by="", arg="") -> list:
+    def fetch_price_records(self, start_date: str, end_date: str, by="", arg="") -> pd.DataFrame:
         """
-        Gets data records from DB using optional parameters
+        Gets data records using optional parameters from the in-memory price store, which is loaded from DB on the
+        first call and refreshed whenever new records are inserted into DB
         Parameters:
             start_date: str
                 The date from which price records are to be fetched
             end_date: str
                 The date to which price records are to be fetched
+            by: str
+                The identifier of which group of price records should be fetched
+            arg: str or list
+                The value of the identifier, a list of symbols if records of multiple products are fetched
+        Returns:
+            pd.DataFrame
+                A DataFrame containing the price records along with the asset classes and products they belong to
+        """
+        return price_store.fetch(self, start_date, end_date, by, arg)
+
+    def fetch_new_price_records(self, last_id=0) -> list:
+        """
+        Gets the price records whose ids are greater than a given one, ordered by product and date
+        Parameters:
+            last_id: int
+                The id of the last record that has already been fetched
+        Returns:
+            list
+                A list containing tuples of data records
+        """
+        self.cursor.execute("""
+            SELECT
+                record.id, product.id, assetclass.name, product.name, product.symbol, record.date,
+                record.open, record.high, record.low, record.close
+            FROM
+                rankingtable_pricerecord AS record
+                JOIN rankingtable_product AS product
+                JOIN rankingtable_assetclass AS assetclass
+            ON
+                record.product_id = product.id
+                AND product.assetclass_id = assetclass.id
+            WHERE record.id > ?
+            ORDER BY product.id, record.date
+        """, (last_id, ))
+
+        return self.cursor.fetchall()
+
+    def fetch_last_price_id(self) -> int:
+        """
+        Gets the id of the most recently inserted price record
+        Parameters:
+            None
+        Returns:
+            int
+                The id of the last record, 0 if there is none
+        """
+        last_id = self.cursor.execute("SELECT MAX(id) FROM rankingtable_pricerecord").fetchone()[0]
+
+        return last_id if last_id else 0
+
+    def fetch_rollup_records(self, period: str, start_date: str, end_date: str, by="", arg="") -> list:
+        """
+        Gets the pre-aggregated bars of a period that lie entirely within a date range from DB
+        Parameters:
+            period: str
+                The period of the bars, either w, m or y
+            start_date: str
+                The date from which bars are to be fetched
+            end_date: str
+                The date to which bars are to be fetched
+            by: str
+                The identifier of which group of bars should be fetched
+            arg: str
+                The value of the identifier
+        Returns:
+            list
+                A list containing tuples of data records, a product without any bar in the date range has a single
+                record whose bar columns are None
+        """
+        # Execute query with situational arguments
+        query_dict = {
+            "": "",
+            "asset class": "WHERE assetclass.name = ?",
+            "product": "WHERE product.symbol = ?",
+        }
+        params_list = [period, start_date, end_date, arg] if by != "" else [period, start_date, end_date]
+        self.cursor.execute(f"""
+            SELECT
+                assetclass.name, product.name, rollup.bucket,
+                rollup.open, rollup.high, rollup.low, rollup.close, rollup.first_date, rollup.date
+            FROM
+                rankingtable_product AS product
+                JOIN rankingtable_assetclass AS assetclass
+                    ON product.assetclass_id = assetclass.id
+                LEFT JOIN rankingtable_pricerollup AS rollup
+                    ON rollup.product_id = product.id
+                    AND rollup.period = ? AND rollup.first_date >= ? AND rollup.date <= ?
+            {query_dict.get(by)}
+        """, params_list)
+
+        return self.cursor.fetchall()
+
+    def fetch_latest_price_records(self, by="", arg="") -> list:
+        """
+        Gets the latest price record of every product using optional parameters
+        Parameters:
             by: str
                 The identifier of which group of price records should be fetched
             arg: str
@@ -465,29 +722,67 @@ class DataReader:
         # Execute query with situational arguments
         query_dict = {
             "": "",
-            "asset class": "assetclass.name",
-            "product": "product.symbol",
+            "asset class": "WHERE assetclass.name = ?",
+            "product": "WHERE product.symbol = ?",
         }
-        query = f"{query_dict.get(by)} = ? AND" if by != "" else ""
-        params_list = [arg, start_date, end_date] if by != "" else [start_date, end_date]
+        params_list = [arg] if by != "" else []
         self.cursor.execute(f"""
             SELECT
-                assetclass.name, product.name, product.symbol, record.date,
-                record.open, record.high, record.low, record.close
+                assetclass.name, product.name, product.symbol, latest.date,
+                latest.open, latest.high, latest.low, latest.close
             FROM
-                rankingtable_pricerecord AS record
+                rankingtable_productlatest AS latest
                 JOIN rankingtable_product AS product
                 JOIN rankingtable_assetclass AS assetclass
             ON
-                record.product_id = product.id
+                latest.product_id = product.id
                 AND product.assetclass_id = assetclass.id
-            WHERE
-                {query}
-                record.date >= ? AND record.date <= ?
+            {query_dict.get(by)}
         """, params_list)
 
         return self.cursor.fetchall()
 
+    def fetch_price_extremes(self, symbol: str) -> tuple or None:
+        """
+        Gets the minimum and maximum of every OHLC column among the price records of a product
+        Parameters:
+            symbol: str
+                The symbol of the product
+        Returns:
+            tuple
+                The array of the minimums and that of the maximums, in the order of open, high, low and close,
+                None if the product has no records
+        """
+        extremes = \
+            self.cursor.execute("""
+                SELECT
+                    MIN(record.open), MIN(record.high), MIN(record.low), MIN(record.close),
+                    MAX(record.open), MAX(record.high), MAX(record.low), MAX(record.close)
+                FROM
+                    rankingtable_pricerecord AS record
+                    JOIN rankingtable_product AS product
+                ON record.product_id = product.id
+                WHERE product.symbol = ?
+            """, (symbol, )).fetchone()
+        if extremes is None or extremes[0] is None:
+            return None
+
+        extremes = np.array(extremes, dtype=np.float64)
+        return extremes[:4], extremes[4:]
+
+    def fetch_data_version(self) -> int:
+        """
+        Gets the version of the data in DB, which is incremented whenever new records are inserted
+        Parameters:
+            None
+        Returns:
+            int
+                The current data version, 0 if no records have been inserted
+        """
+        version = self.cursor.execute("SELECT MAX(version) FROM rankingtable_dataversion").fetchone()[0]
+
+        return version if version else 0
+
     def fetch_latest_date_records(self) -> list:
         """
         Gets the most recent records available in DB
@@ -498,28 +793,110 @@ class DataReader:
                 A list containing tuples of data records
         """
         self.cursor.execute(f"""
-            SELECT assetclass.name, product.symbol, product.alias, MAX(record.date)
-            FROM 
+            SELECT assetclass.name, product.symbol, product.alias, latest.date
+            FROM
                 rankingtable_assetclass AS assetclass
-                JOIN rankingtable_pricerecord AS record
-                JOIN rankingtable_product AS product 
-            ON 
+                JOIN rankingtable_productlatest AS latest
+                JOIN rankingtable_product AS product
+            ON
                 assetclass.id = product.assetclass_id
-                AND record.product_id = product.id 
-            GROUP BY product.symbol 
+                AND latest.product_id = product.id
         """)
         date_records = self.cursor.fetchall()
 
         return date_records
 
 
+def read_price_records(FILE_DIR: str, entry=None, extremes=None) -> tuple:
+    """
+    Reads and normalizes the price records of a product that are stored in a CSV file and have not been ingested
+    yet, the function is defined at module level so that it can be run by worker processes
+    Parameters:
+        FILE_DIR: str
+            The directory of the file, whose name is the symbol of the product
+        entry: ManifestEntry
+            The manifest entry of the file, None if the file has never been ingested
+        extremes: tuple
+            The minimums and maximums of the existing records of the product, see DataReader.fetch_price_extremes
+    Returns:
+        tuple
+            The symbol of the product, a DataFrame of its new price records, which is None if there are none or
+            the file is not CSV, and the new manifest entry of the file, which is None if the file is not CSV
+    """
+    symbol = Path(FILE_DIR).stem
+    try:
+        data, entry = read_new_rows(FILE_DIR, entry)
+    except UnicodeDecodeError:
+        print(f"File must be of CSV format '{FILE_DIR}'")
+        return symbol, None, None
+
+    if data is None or data.empty:
+        return symbol, None, entry
+
+    data = data[["Date", "Open", "High", "Low", "Close"]]
+    return symbol, DataNormalization(data).clean(extremes=extremes), entry
+
+
+def read_tail(FILE_DIR: str, rows=1, block_size=4096) -> tuple:
+    """
+    Reads the header and the last rows of a CSV file, the file is read backwards block by block from its end,
+    so that the time taken does not depend on the number of rows in the file
+    Parameters:
+        FILE_DIR: str
+            The directory of the file
+        rows: int
+            The maximum number of last rows to be read, blank lines are skipped like pd.read_csv does
+        block_size: int
+            The number of bytes read at a time
+    Returns:
+        tuple
+            The header and a list of the last rows, both of which are lists of fields, the header is
+            an empty list if the file is empty
+    """
+    with open(FILE_DIR, "rb") as file:
+        header = file.readline()
+        while header and not header.strip():
+            header = file.readline()
+        header_end = file.tell()
+
+        position = file.seek(0, os.SEEK_END)
+        tail = b""
+        last_rows = list()
+        while position > header_end and len(last_rows) < rows:
+            block_size = min(block_size, position - header_end)
+            position = file.seek(position - block_size)
+            tail = file.read(block_size) + tail
+
+            # The first line might be cut in the middle unless the block reaches the header
+            lines = tail.splitlines()[1:] if position > header_end else tail.splitlines()
+            last_rows = [line for line in lines if line.strip()]
+
+    header = next(csv.reader([header.decode("utf-8-sig")]), list())
+    last_rows = list(csv.reader(line.decode("utf-8") for line in last_rows[-rows:]))
+
+    return header, last_rows
+
+
+# Applied while the DB is bulk loaded, durability is traded for speed since
+# an interrupted load can always be resumed from the CSV files
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "journal_mode": "MEMORY",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",
+}
+
+
 class DbController:
     """
     The interface between the App and DB operations
     """
-    def __init__(self, connection: sqlite3.Connection):
+    def __init__(self, connection: sqlite3.Connection, calendars=None):
         self.connection = connection
 
+        # The trading calendars of the asset classes, which tell when new records are available
+        self.calendars = calendars if calendars is not None else trading_calendars
+
     def _is_empty(self, FILE_DIR: str) -> bool:
         """
         Checks if the specified file is empty or does not exist
@@ -531,15 +908,12 @@ class DbController:
             True otherwise
         """
         try:
-            file = pd.read_csv(FILE_DIR)
-            if file.shape[0] < 2:
-                return True
-            return False
-        except pd.errors.EmptyDataError:
-            return True
+            header, last_rows = read_tail(FILE_DIR, rows=2)
         except FileNotFoundError:
             return True
 
+        return len(last_rows) < 2
+
     def _up_to_date(self, FILE_DIR: str, asset_class: str, end_date: datetime) -> bool or None:
         """
         Checks whether the CSV file contains up-to-date records
@@ -562,25 +936,13 @@ class DbController:
             return None
 
             # The last record in the CSV file has the most recent date
-        last_date_csv = pd.read_csv(FILE_DIR).tail(1)["Date"].values
-        last_date_csv = pd.to_datetime(last_date_csv, utc=True).date[0]
-
-        # Cryptocurrency data is continuously updated everyday, while other
-        # asset classes stop trading on every Saturday and Sunday
-        last_trading_day = end_date - pd.to_timedelta(1, unit="D")
-        if asset_class != "Cryptocurrency":
-            timedelta_dict = {
-                0: pd.to_timedelta(2, unit="D"),
-                6: pd.to_timedelta(1, unit="D"),
-            }
-            weekday = end_date.weekday()
-            if weekday in timedelta_dict:
-                last_trading_day = last_trading_day - timedelta_dict.get(weekday)
-
-        if last_date_csv == last_trading_day:
-            return True
+        header, last_rows = read_tail(FILE_DIR)
+        last_date_csv = last_rows[-1][header.index("Date")]
+        last_date_csv = pd.to_datetime(last_date_csv, utc=True).date()
 
-        return False
+        # The records are up to date unless a session after the last record has closed before the end date,
+        # e.g. on weekends and holidays of exchanges, cryptocurrencies are traded everyday
+        return self.calendars.get(asset_class).is_up_to_date(last_date_csv, before=end_date)
 
     def fetch_records(self, record_type: str, *args) -> list:
         """
@@ -599,7 +961,11 @@ class DbController:
             "asset class": reader.fetch_assetclass_records,
             "product": reader.fetch_product_records,
             "price record": reader.fetch_price_records,
+            "price rollup": reader.fetch_rollup_records,
             "latest date": reader.fetch_latest_date_records,
+            "latest price": reader.fetch_latest_price_records,
+            "data version": reader.fetch_data_version,
+            "price extremes": reader.fetch_price_extremes,
         }
         return method_dict.get(record_type)(*args)
 
@@ -626,21 +992,28 @@ class DbController:
 
             # Remove file extension
             data = pd.Series(data).str.split(".").str.get(0)
-            data.name = dir.split("\\")[-1]
+            data.name = Path(dir).name
 
         if table == "price record":
-            try:
-                data = pd.read_csv(dir)[["Date", "Open", "High", "Low", "Close"]]
-            except UnicodeDecodeError:
-                print(f"File must be of CSV format '{dir}'")
-                return None
-
-            data = DataNormalization(data).clean()
-            data.name = dir.split("\\")[-1].split(".")[0]
+            # Only the rows that are appended to the file since it was last ingested are read, the records and the
+            # manifest entry of the file are committed in the same transaction
+            manifest = IngestManifest(self.connection)
+            entry = manifest.get(dir)
+            extremes = self.fetch_records("price extremes", Path(dir).stem)
+            symbol, data, new_entry = read_price_records(dir, entry, extremes)
+            adapter = DbAdapter(self.connection, autocommit=False)
+            with self.connection:
+                if data is not None:
+                    data.name = symbol
+                    adapter.insert_into(table, data)
+                    adapter.flush()
+                if new_entry is not None and new_entry != entry:
+                    manifest.update(new_entry)
+            return None
 
         adapter.insert_into(table, data)
 
-    def batch_insert(self, BASE_DIR: str) -> None:
+    def batch_insert(self, BASE_DIR: str, bulk=False) -> None:
         """
         Inserts all types of data and data records that are available in a directory into DB at once
         Parameters:
@@ -648,10 +1021,15 @@ class DbController:
                 The data directory, which has two levels of depth, the first level contains folders
                 whose names represent the asset classes, the second level contains a list of files,
                 in each of which are the price records.
+            bulk: bool
+                Whether price records are inserted in bulk load mode, see bulk_insert
         Returns:
             None
                 Data is inserted directly into DB
         """
+        if bulk:
+            return self.bulk_insert(BASE_DIR)
+
         # Insert asset class data
         self.insert_records("asset class", BASE_DIR)
 
@@ -665,7 +1043,108 @@ class DbController:
                 FILE_DIR = os.path.join(FOLDER_DIR, FILE)
                 self.insert_records("price record", FILE_DIR)
 
-    def update_db(self, SOURCE: str, BASE_DIR: str) -> None:
+    def _set_pragmas(self, pragmas: dict) -> dict:
+        """
+        Sets SQLite pragmas on the connection
+        Parameters:
+            pragmas: dict
+                The values of the pragmas to be set
+        Returns:
+            dict
+                The previous values of the pragmas, so that they can be restored
+        """
+        cursor = self.connection.cursor()
+        previous_pragmas = dict()
+        for pragma, value in pragmas.items():
+            previous_pragmas[pragma] = str(cursor.execute(f"PRAGMA {pragma}").fetchone()[0])
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+        return previous_pragmas
+
+    def bulk_insert(self, BASE_DIR: str, workers=None, queue_size=32, transaction_size=1000000) -> None:
+        """
+        Inserts all types of data and data records that are available in a directory into DB in bulk load mode.
+        CSV files are read and normalized in a pool of worker processes, while a single writer inserts their price
+        records in large transactions with the bulk load pragmas applied
+        Parameters:
+            BASE_DIR: str
+                The same as that in batch_insert method
+            workers: int
+                The number of worker processes, defaults to the number of CPUs
+            queue_size: int
+                The maximum number of files that are read or waiting to be inserted at the same time
+            transaction_size: int
+                The number of price records after which the writer commits
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        # Insert asset class and product data, which are small enough to be inserted as usual
+        self.insert_records("asset class", BASE_DIR)
+        FILE_DIRS = list()
+        for FOLDER in os.listdir(BASE_DIR):
+            FOLDER_DIR = os.path.join(BASE_DIR, FOLDER)
+            self.insert_records("product", FOLDER_DIR)
+            FILE_DIRS.extend(os.path.join(FOLDER_DIR, FILE) for FILE in os.listdir(FOLDER_DIR))
+
+        # Pragmas such as journal_mode cannot be changed within a transaction, nor can a database in WAL mode be
+        # switched to another mode while readers are connected, WAL needs no rollback journal anyway
+        self.connection.commit()
+        pragmas = dict(BULK_LOAD_PRAGMAS)
+        if self.connection.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            pragmas.pop("journal_mode")
+        previous_pragmas = self._set_pragmas(pragmas)
+
+        adapter = DbAdapter(self.connection, autocommit=False)
+        manifest = IngestManifest(self.connection)
+        pending_rows = 0
+
+        def write(future) -> None:
+            nonlocal pending_rows
+            symbol, data, entry = future.result()
+            if entry is not None:
+                manifest.update(entry)
+            if data is None:
+                return None
+            data.name = symbol
+            adapter.insert_into("price record", data)
+
+            pending_rows += len(data)
+            if pending_rows >= transaction_size:
+                adapter.flush()
+                self.connection.commit()
+                pending_rows = 0
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Files being read form a bounded queue, the writer waits for any of them
+                # to be done before another file is submitted once the queue is full
+                futures = set()
+                for FILE_DIR in FILE_DIRS:
+                    # Files that are unchanged since they were last ingested are skipped
+                    entry = manifest.get(FILE_DIR)
+                    if is_unchanged(FILE_DIR, entry):
+                        continue
+
+                    if len(futures) >= queue_size:
+                        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future)
+                    extremes = self.fetch_records("price extremes", Path(FILE_DIR).stem)
+                    futures.add(executor.submit(read_price_records, FILE_DIR, entry, extremes))
+
+                for future in wait(futures).done:
+                    write(future)
+
+            adapter.flush()
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            self._set_pragmas(previous_pragmas)
+
+    def update_db(self, SOURCE: str, BASE_DIR: str, downloader=None, direct=False, archive=True) -> None:
         """
         Updates DB with new price records that are available and span up to the current date - 1 (yesterday)
         !! Attention !!
@@ -676,27 +1155,206 @@ class DbController:
                 The source from where data is obtained
             BASE_DIR: str
                 The same as that in batch_insert method
+            downloader: Downloader
+                The downloader through which price records are obtained, which downloads from
+                yahoo-finance by default
+            direct: bool
+                Whether downloaded records are normalized in memory and inserted straight into DB, instead of
+                being appended to the CSV files which are then inserted by batch_insert
+            archive: bool
+                Whether downloaded records are still appended to the CSV files in direct mode
         Returns:
             None
                 Data is updated directly into CSV files and DB
         """
         if SOURCE == "yfinance":
-            date_records = self.fetch_records("latest date")
-            for asset_class, symbol, alias, record_date in date_records:
-                # Set the start date to be the day after the latest date available in DB
-                start_date = pd.to_datetime(record_date, yearfirst=True, utc=True) \
-                             + pd.to_timedelta(1, unit="d")
-                end_date = pd.Timestamp.today().date()
-
-                # Download new a CSV file and append new data to the existing file
-                DIR = os.path.join(os.path.abspath(BASE_DIR), asset_class)
-                self.download_csv(DIR, asset_class, symbol, alias, None, start_date, end_date)
+            self.update_products(self.fetch_records("latest date"), BASE_DIR, downloader, direct, archive,
+                                 refresh_store=True)
 
+    def update_products(self, date_records: list, BASE_DIR: str, downloader=None, direct=False, archive=True,
+                        end_date=None, refresh_store=False) -> dict:
+        """
+        Updates DB with new price records of a list of products from yahoo-finance
+        Parameters:
+            date_records: list
+                A list containing tuples of the asset class, symbol, alias and latest date of every product,
+                as fetched by DataReader.fetch_latest_date_records
+            BASE_DIR: str
+                The same as that in batch_insert method
+            downloader, direct, archive:
+                The same as those in update_db method
+            end_date: date
+                The day before which records are downloaded, defaults to the current date (today)
+            refresh_store: bool
+                Whether the new records are loaded into the in-memory price store of this process, which is only
+                worth it if the process serves requests, other processes refresh their stores when they are read
+        Returns:
+            dict
+                The error of every product whose download failed, None for the other products
+        """
+        downloader = downloader if downloader is not None else Downloader()
+        end_date = end_date if end_date is not None else pd.Timestamp.today().date()
+
+        downloads = list()
+        for asset_class, symbol, alias, record_date in date_records:
+            # Set the start date to be the day after the latest date available in DB
+            start_date = pd.to_datetime(record_date, yearfirst=True, utc=True) \
+                         + pd.to_timedelta(1, unit="d")
+
+            # Skip the products whose next session has not closed yet, then those whose CSV files are up to date,
+            # in direct mode the freshness of a product only depends on its latest date in DB
+            if self.calendars.get(asset_class).is_up_to_date(record_date, before=end_date):
+                continue
+            DIR = os.path.join(os.path.abspath(BASE_DIR), asset_class)
+            download = self._prepare_download(DIR, asset_class, symbol, alias, None, start_date, end_date,
+                                              direct, archive)
+            if download is not None:
+                downloads.append(download)
+
+        # Download all the new records concurrently, then insert them into DB and/or append them to the files,
+        # the records of every product and their manifest entries are committed in a single transaction
+        results = downloader.download([request for request, _, _ in downloads])
+        adapter = DbAdapter(self.connection, autocommit=False)
+        try:
+            for (request, FILE_DIR, insert_header), historical_data in zip(downloads, results):
+                if direct:
+                    self._insert_download(adapter, request, historical_data)
+                if archive or not direct:
+                    self._save_download(FILE_DIR, request, historical_data, insert_header, ingested=direct)
+            adapter.flush()
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+
+        for timing in downloader.timings:
+            print(
+                f"{timing['symbol']}: {timing['records']} records in {timing['seconds']:.2f}s, "
+                f"{timing['attempts']} attempt(s)" + (f", failed: {timing['error']}" if timing["error"] else "")
+            )
+
+        if not direct:
             self.batch_insert(BASE_DIR)
 
+        # Load the new records into the in-memory price store
+        if refresh_store:
+            price_store.refresh(DataReader(self.connection))
+
+        errors = {symbol: None for _, symbol, _, _ in date_records}
+        errors.update({timing["symbol"]: timing["error"] for timing in downloader.timings})
+        return errors
+
+    def _prepare_download(self, BASE_DIR: str, asset_class: str,
+                          symbol: str, alias: str, period: str,
+                          start_date: datetime, end_date: datetime, direct=False, archive=True) -> tuple or None:
+        """
+        Decides which price records of a product have to be downloaded, all of them if its CSV file is empty
+        Parameters:
+            The same as those in download_csv method
+            direct, archive:
+                The same as those in update_db method, in direct mode records are downloaded from the given start
+                date, i.e. the day after the latest date in DB, and the CSV file is only looked at if it is archived to
+        Returns:
+            tuple
+                The download request, the directory of the CSV file and whether the header has to be written
+            None
+                If the CSV file is up to date
+        """
+        FILE_DIR = os.path.join(BASE_DIR, symbol + ".csv")
+        if direct:
+            # The records are missing from DB regardless of what the CSV file contains
+            insert_header = archive and self._is_empty(FILE_DIR)
+        elif self._is_empty(FILE_DIR):
+            period = "max"
+            insert_header = True
+        else:
+            if self._up_to_date(FILE_DIR, asset_class, end_date):
+                print(f"{symbol} is up to date")
+                return None
+            insert_header = False
+
+        return DownloadRequest(symbol, alias, period, start_date, end_date), FILE_DIR, insert_header
+
+    def _insert_download(self, adapter, request: DownloadRequest, historical_data: pd.DataFrame or None) -> None:
+        """
+        Normalizes downloaded price records in memory and inserts them straight into DB
+        Parameters:
+            adapter: DbAdapter
+                The adapter through which the records are inserted, they are committed by the caller
+            request: DownloadRequest
+                The arguments of the download
+            historical_data: pd.DataFrame or None
+                The downloaded price records, None if the download failed
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        if historical_data is None or historical_data.empty:
+            return None
+
+        # Dates are formatted the same as they are read back from the CSV files
+        data = historical_data[["Date", "Open", "High", "Low", "Close"]].copy()
+        data["Date"] = pd.to_datetime(data["Date"], yearfirst=True, utc=True).dt.strftime("%Y-%m-%d")
+
+        # Rounded with the decimals of all the records of the product, the same as those read from the CSV files
+        extremes = self.fetch_records("price extremes", request.symbol)
+        data = DataNormalization(data).clean(extremes=extremes)
+        data.name = request.symbol
+        adapter.insert_into("price record", data)
+
+    def _save_download(self, FILE_DIR: str, request: DownloadRequest,
+                       historical_data: pd.DataFrame or None, insert_header: bool, ingested=False) -> None:
+        """
+        Appends downloaded price records to the CSV file of their product, or creates the file
+        Parameters:
+            FILE_DIR: str
+                The directory of the CSV file
+            request: DownloadRequest
+                The arguments of the download
+            historical_data: pd.DataFrame or None
+                The downloaded price records, None if the download failed
+            insert_header: bool
+                Whether the header has to be written, i.e. the file is empty
+            ingested: bool
+                Whether the records have already been inserted into DB, in which case the file is recorded in the
+                ingest manifest so that batch_insert does not read them again, the entry is committed by the caller
+                together with the records
+        Returns:
+            None
+                Data is inserted directly to CSV files
+        """
+        if historical_data is None:
+            print(f"Failed to download new data records {request.symbol}")
+            return None
+        if historical_data.empty:
+            print(f"No new data records {request.symbol} from yfinance")
+            return None
+
+        # The file can only be recorded as ingested if all of its previous rows have been ingested as well
+        manifest = IngestManifest(self.connection)
+        if ingested:
+            ingested = not os.path.exists(FILE_DIR) or is_unchanged(FILE_DIR, manifest.get(FILE_DIR))
+
+        start_date = request.start_date
+        historical_data["Date"] = pd.to_datetime(historical_data["Date"], yearfirst=True, utc=True)
+
+        # In direct mode the CSV file might be ahead of DB, the records it already contains are not appended again
+        if not insert_header:
+            header, last_rows = read_tail(FILE_DIR)
+            last_date_csv = pd.to_datetime(last_rows[-1][header.index("Date")], utc=True)
+            historical_data = historical_data.query("Date > @last_date_csv")
+
+        # Datasets originate from different timezones, so that their dates might appear different,
+        # but the actual records are the same as those existing in DB
+        if not historical_data.query("Date >= @start_date").empty:
+            historical_data.to_csv(FILE_DIR, header=insert_header, mode="a", index=False)
+
+            if ingested:
+                manifest.update(scan_file(FILE_DIR))
+
     def download_csv(self, BASE_DIR: str, asset_class: str,
                      symbol: str, alias: str, period: str,
-                     start_date: datetime, end_date: datetime) -> None:
+                     start_date: datetime, end_date: datetime, downloader=None) -> None:
         """
         Downloads price records of a particular product and asset class in CSV file format from yahoo-finance,
         appends new data to the existing files or creates new ones
@@ -715,32 +1373,17 @@ class DbController:
                 The start of the date range of the price records
             end_date: str
                 The end of the date range of the price records
+            downloader: Downloader
+                The same as that in update_db method
         Returns:
             None
                 Data is inserted directly to CSV files
         """
-        FILE_DIR = os.path.join(BASE_DIR, symbol + ".csv")
-        if self._is_empty(FILE_DIR):
-            period = "max"
-            insert_header = True
-        else:
-            if self._up_to_date(FILE_DIR, asset_class, end_date):
-                print(f"{symbol} is up to date")
-                return None
-            insert_header = False
+        download = self._prepare_download(BASE_DIR, asset_class, symbol, alias, period, start_date, end_date)
+        if download is None:
+            return None
 
-        try:
-            # Download daily price records within a given period
-            if period:
-                historical_data = yf.Ticker(alias).history(period=period).reset_index()
-            # Download daily price records within a specified time interval
-            else:
-                historical_data = yf.Ticker(alias).history(start=start_date, end=end_date).reset_index()
-            historical_data["Date"] = pd.to_datetime(historical_data["Date"], yearfirst=True, utc=True)
-
-            # Datasets originate from different timezones, so that their dates might appear different,
-            # but the actual records are the same as those existing in DB
-            if not historical_data.query("Date >= @start_date").empty:
-                historical_data.to_csv(FILE_DIR, header=insert_header, mode="a", index=False)
-        except IndexError:  # When yfinance returns an empty Data Frame
-            print(f"No new data records {symbol} from yfinance")
+        request, FILE_DIR, insert_header = download
+        downloader = downloader if downloader is not None else Downloader()
+        historical_data = downloader.download([request])[0]
+        self._save_download(FILE_DIR, request, historical_data, insert_header)
@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from threading import Lock
+import yfinance as yf
+import pandas as pd
+import time
+
+
+# The arguments of a download, period takes precedence over the date range if it is specified
+DownloadRequest = namedtuple("DownloadRequest", ["symbol", "alias", "period", "start_date", "end_date"])
+
+
+class Fetcher(ABC):
+    """
+    The interface of the sources from which price records are downloaded, requests to the same host share a
+    rate limit. Fetchers must be safe to be called from multiple threads.
+    """
+    host = ""
+
+    @abstractmethod
+    def fetch(self, alias: str, period=None, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Downloads the daily price records of a product
+        Parameters:
+            alias: str
+                The trading symbol of the product
+            period: str
+                The time interval of the price records
+            start_date: datetime
+                The start of the date range of the price records
+            end_date: datetime
+                The end of the date range of the price records
+        Returns:
+            pd.DataFrame
+                A DataFrame containing the Date and OHLC columns of the price records
+        """
+
+
+class YFinanceFetcher(Fetcher):
+    """
+    Downloads price records from yahoo-finance
+    """
+    host = "query2.finance.yahoo.com"
+
+    def fetch(self, alias: str, period=None, start_date=None, end_date=None) -> pd.DataFrame:
+        # Download daily price records within a given period
+        if period:
+            return yf.Ticker(alias).history(period=period).reset_index()
+        # Download daily price records within a specified time interval
+        return yf.Ticker(alias).history(start=start_date, end=end_date).reset_index()
+
+
+class RateLimiter:
+    """
+    Spaces out requests to a host evenly, so that no more than a given number of requests are sent per second
+    """
+    def __init__(self, rate: float):
+        self._lock = Lock()
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+
+    def wait(self) -> None:
+        """
+        Blocks the calling thread until the next request is allowed to be sent
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self.next_time - now, 0)
+            self.next_time = max(self.next_time, now) + self.interval
+
+        if delay:
+            time.sleep(delay)
+
+
+class Downloader:
+    """
+    Downloads the price records of multiple products concurrently in a bounded pool of threads, requests are rate
+    limited per host and retried with exponential backoff when they fail
+    """
+    def __init__(self, fetcher=None, workers=8, rate=2.0, retries=3, backoff=1.0):
+        self.fetcher = fetcher if fetcher is not None else YFinanceFetcher()
+        self.workers = workers
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+
+        # The time taken by every request of the last download, in the order they are completed
+        self.timings = list()
+
+        self._lock = Lock()
+        self._rate_limiters = dict()
+
+    def _get_rate_limiter(self, host: str) -> RateLimiter:
+        """
+        Gets the rate limiter shared by every request to a host
+        """
+        with self._lock:
+            if host not in self._rate_limiters:
+                self._rate_limiters[host] = RateLimiter(self.rate)
+            return self._rate_limiters[host]
+
+    def _download(self, request: DownloadRequest) -> pd.DataFrame or None:
+        """
+        Downloads the price records of a product, retrying up to the given number of times when the fetcher fails
+        Parameters:
+            request: DownloadRequest
+                The arguments of the download
+        Returns:
+            pd.DataFrame
+                The price records, which is empty if there are none, None if every attempt fails
+        """
+        rate_limiter = self._get_rate_limiter(self.fetcher.host)
+        start = time.perf_counter()
+        data, error = None, None
+
+        for attempt in range(1, self.retries + 2):
+            rate_limiter.wait()
+            try:
+                data = self.fetcher.fetch(request.alias, request.period, request.start_date, request.end_date)
+                error = None
+                break
+            except IndexError:  # When yfinance returns an empty Data Frame
+                data, error = pd.DataFrame(), None
+                break
+            except Exception as exception:
+                error = exception
+                if attempt <= self.retries:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+
+        with self._lock:
+            self.timings.append({
+                "symbol": request.symbol,
+                "seconds": round(time.perf_counter() - start, 6),
+                "attempts": attempt,
+                "records": len(data) if data is not None else 0,
+                "error": repr(error) if error is not None else None,
+            })
+
+        return data
+
+    def download(self, requests: list) -> list:
+        """
+        Downloads the price records of multiple products concurrently
+        Parameters:
+            requests: list
+                A list of DownloadRequest
+        Returns:
+            list
+                The price records of every request in the same order, see _download, the time taken
+                by every request is recorded in timings
+        """
+        self.timings = list()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self._download, requests))
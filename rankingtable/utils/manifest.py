@@ -0,0 +1,170 @@
+from collections import namedtuple
+import hashlib
+import sqlite3
+import io
+import os
+import pandas as pd
+
+
+# The state of a file at the time its rows were last ingested, offset is the end of the last complete row being
+# ingested and hash is the SHA-256 digest of the header row and of the HASH_WINDOW bytes before offset, which tells
+# whether the ingested part of the file is unchanged without reading all of it. Rows are ingested by date, rows that
+# are edited in place before that window are not ingested again in any case
+ManifestEntry = namedtuple("ManifestEntry", ["path", "size", "mtime", "hash", "offset"])
+HASH_WINDOW = 64 * 1024
+
+
+def is_unchanged(path: str, entry) -> bool:
+    """
+    Checks if a file is unchanged since it was last ingested, judging by its size and modification time
+    Parameters:
+        path: str
+            The directory of the file
+        entry: ManifestEntry
+            The manifest entry of the file, None if the file has never been ingested
+    Returns:
+        bool
+            True if the file is unchanged, False otherwise
+    """
+    if entry is None:
+        return False
+    stat = os.stat(path)
+
+    return entry.size == stat.st_size and entry.mtime == stat.st_mtime
+
+
+def _hash_prefix(file, header_end: int, offset: int) -> str:
+    """
+    Gets the SHA-256 digest of the header row of an open file and of the HASH_WINDOW bytes before an offset
+    """
+    file.seek(0)
+    digest = hashlib.sha256(file.read(header_end))
+    start = max(header_end, offset - HASH_WINDOW)
+    file.seek(start)
+    digest.update(file.read(max(offset - start, 0)))
+
+    return digest.hexdigest()
+
+
+def read_new_rows(path: str, entry=None, **kwargs) -> tuple:
+    """
+    Reads the rows of a CSV file that have not been ingested yet. Only the appended rows are read if the
+    previously ingested part of the file is unchanged, every row is read if it has been modified
+    Parameters:
+        path: str
+            The directory of the file
+        entry: ManifestEntry
+            The manifest entry of the file, None if the file has never been ingested
+        kwargs:
+            Keyword arguments passed to pd.read_csv, which always receives the header row of the file
+    Returns:
+        tuple
+            A DataFrame of the new rows, which is None if the file is unchanged, and the new manifest entry
+    """
+    path = os.path.abspath(path)
+    if is_unchanged(path, entry):
+        return None, entry
+
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        header = file.readline()
+        header_end = len(header) if header.endswith(b"\n") else 0
+
+        # Rows are only read from the previous offset onwards if the bytes before it are unchanged
+        start = header_end
+        if entry is not None and 0 < header_end <= entry.offset <= stat.st_size \
+                and _hash_prefix(file, header_end, entry.offset) == entry.hash:
+            start = entry.offset
+        file.seek(start)
+        content = file.read()
+
+        # A trailing row without a line break might still be being written, it is left to the next ingestion
+        offset = start + content.rfind(b"\n") + 1
+        new_entry = ManifestEntry(path, stat.st_size, stat.st_mtime, _hash_prefix(file, header_end, offset), offset)
+
+    if header_end == 0 or offset <= start:
+        return pd.DataFrame(), new_entry
+
+    data = pd.read_csv(io.BytesIO(header + content[:offset - start]), **kwargs)
+
+    return data, new_entry
+
+
+def scan_file(path: str, block_size=4096) -> ManifestEntry:
+    """
+    Gets the manifest entry of a file whose rows have all been ingested by other means, without parsing it, the file
+    is read backwards block by block from its end until the last line break is found
+    Parameters:
+        path: str
+            The directory of the file
+        block_size: int
+            The number of bytes read at a time
+    Returns:
+        ManifestEntry
+            The entry of the file
+    """
+    path = os.path.abspath(path)
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        header = file.readline()
+        header_end = len(header) if header.endswith(b"\n") else 0
+
+        offset = stat.st_size
+        while offset > header_end:
+            start = max(offset - block_size, header_end)
+            file.seek(start)
+            position = file.read(offset - start).rfind(b"\n")
+            if position >= 0:
+                offset = start + position + 1
+                break
+            offset = start
+        offset = max(offset, header_end)
+
+        return ManifestEntry(path, stat.st_size, stat.st_mtime, _hash_prefix(file, header_end, offset), offset)
+
+
+class IngestManifest:
+    """
+    Keeps track of the files that have been ingested into DB, so that only new or changed files are processed
+    """
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+
+    def get(self, path: str) -> ManifestEntry or None:
+        """
+        Gets the manifest entry of a file
+        Parameters:
+            path: str
+                The directory of the file
+        Returns:
+            ManifestEntry
+                The entry of the file, None if the file has never been ingested
+        """
+        record = \
+            self.cursor.execute(
+                "SELECT path, size, mtime, hash, offset FROM rankingtable_ingestmanifest WHERE path = ?",
+                (os.path.abspath(path), )
+            ).fetchone()
+
+        return ManifestEntry(*record) if record else None
+
+    def update(self, entry: ManifestEntry) -> None:
+        """
+        Records the state of a file whose rows have been ingested, the change is committed along with the records
+        Parameters:
+            entry: ManifestEntry
+                The new entry of the file
+        Returns:
+            None
+                Data is inserted directly into DB
+        """
+        self.cursor.execute("""
+            INSERT INTO rankingtable_ingestmanifest (path, size, mtime, hash, offset)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size,
+                mtime = excluded.mtime,
+                hash = excluded.hash,
+                offset = excluded.offset
+        """, tuple(entry))
@@ -29,11 +29,104 @@ def add_period(data: pd.DataFrame, period: str) -> pd.DataFrame:
     return data
 
 
+def period_group(keys: list, period: str) -> list:
+    """
+    Gets the columns by which daily records are grouped into the bars of a period
+    """
+    return keys + ["y", period] if period != "y" else keys + ["y"]
+
+
+def aggregate_period(data: pd.DataFrame, period: str, keys: list) -> pd.DataFrame:
+    """
+    Aggregates daily records into OHLC bars, one bar for every group of keys in every time period
+    """
+    if period not in data.columns:
+        data = add_period(data, period)
+
+    return data.groupby(period_group(keys, period)).aggregate({"low": "min", "high": "max",
+                                                               "open": "first", "close": "last",
+                                                               "date": "last"})
+
+
+def to_rollup(data: pd.DataFrame, period: str, keys: list) -> pd.DataFrame:
+    """
+    Aggregates daily records into the bars stored in the rollup table, whose time periods are encoded into a single
+    integer bucket (yyyyww for weeks, yyyymm for months and yyyy for years)
+    """
+    if period not in data.columns:
+        data = add_period(data, period)
+
+    bars = aggregate_period(data, period, keys)
+    bars["first_date"] = data.groupby(period_group(keys, period))["date"].first()
+    bars = bars.reset_index()
+    bars["bucket"] = bars["y"] * 100 + bars[period] if period != "y" else bars["y"]
+
+    return bars
+
+
+def to_monthly_close(data: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """
+    Aggregates daily records into the closes stored in the monthly close table, whose months are encoded into
+    a single integer bucket (yyyymm), the records must be sorted by date
+    """
+    buckets = (data["date"].dt.year * 100 + data["date"].dt.month).rename("bucket")
+    closes = \
+        data.groupby(keys + [buckets]) \
+            .agg(close=("close", "last"), max_close=("close", "max"), min_close=("close", "min"),
+                 date=("date", "last")) \
+            .reset_index()
+
+    return closes
+
+
+def from_rollup(bars: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    Decodes the buckets of the bars stored in the rollup table back into time period columns
+    """
+    bars["y"] = bars["bucket"] // 100 if period != "y" else bars["bucket"]
+    if period != "y":
+        bars[period] = bars["bucket"] % 100
+
+    return bars
+
+
+def to_bucket(dates: pd.Series, period: str) -> np.ndarray:
+    """
+    Encodes the time periods of dates into the buckets of the rollup table (yyyyww for weeks, yyyymm for months and
+    yyyy for years) without grouping them, weeks are ISO weeks paired with calendar years as in add_period
+    """
+    days = dates.to_numpy(dtype="datetime64[D]")
+    years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+    if period == "y":
+        return years
+    if period == "m":
+        return years * 100 + days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    # The ISO week of a date is that of the Thursday of the same week, counted from the start of its year
+    days = days.astype(np.int64)
+    thursdays = days - (days + 3) % 7 + 3
+    new_years = thursdays.astype("datetime64[D]").astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+    return years * 100 + (thursdays - new_years) // 7 + 1
+
+
+def plan_by_period(plan: list) -> dict:
+    """
+    Groups a list of (metric, period) pairs by period, keeping the order in which periods and metrics first appear
+    """
+    grouped_plan = dict()
+    for measurement, period in plan:
+        metrics = grouped_plan.setdefault(period, list())
+        if measurement not in metrics:
+            metrics.append(measurement)
+
+    return grouped_plan
+
+
 class MetricsCalculator:
     """
     Provides a calculator to a set of given metrics
     """
-    def __init__(self, records: pd.DataFrame, columns=None):
+    def __init__(self, records: pd.DataFrame, columns=None, rollups=None):
         # If the records are not wrapped as a Data Frame
         if type(records) is not pd.DataFrame:
             # Ensure column names are of lower cases
@@ -43,6 +136,9 @@ class MetricsCalculator:
         # Sorts data records by date and assign
         self.data = records.sort_values(by=["date"])
 
+        # Pre-aggregated bars of the weekly, monthly and yearly periods, if available
+        self.rollups = {period.lower(): bars for period, bars in (rollups or dict()).items()}
+
     def _validate_period(self, period: str) -> str:
         """
         Checks if the period parameter is given correctly
@@ -119,16 +215,55 @@ class MetricsCalculator:
         # Only adds columns if period is not daily
         if period == "d":
             return data.copy() # Calculations should only be performed on copies of the original dataset
+
+        # Reads the pre-aggregated bars, if any, instead of grouping every daily record
+        if period in self.rollups:
+            return self._merge_rollup(data, period)
+
         if period not in data.columns:
             data = add_period(data, period)
 
         # Groups data by product and period
-        group = ["type", "product", "y", period] if period != "y" else ["type", "product", "y"]
-        data = data.groupby(group).aggregate({"low": "min", "high": "max",
-                                              "open": "first", "close": "last",
-                                              "date": "last"})
+        data = aggregate_period(data, period, ["type", "product"])
         return data
 
+    def _merge_rollup(self, data: pd.DataFrame, period: str) -> pd.DataFrame:
+        """
+        Intermediary method. Combines the pre-aggregated bars of a period with the bars derived from the daily records
+        that are not covered by them, which are those of the partial periods at both ends of the date range.
+        Parameters:
+            data: pd.DataFrame
+                The original dataset
+            period: str
+                The period of the pre-aggregated bars
+        Returns:
+            pd.DataFrame
+                A transformed, grouped dataset identical to the one derived from the daily records alone
+        """
+        rollup = self.rollups[period].copy()
+        rollup["date"] = pd.to_datetime(rollup["date"], yearfirst=True)
+
+        # A daily record is covered if the bar of its product and period has been fetched, bars are only fetched if
+        # they lie entirely within the date range, and a week bar may not span consecutive dates, e.g. the last days of
+        # December that belong to the first ISO week of the next year are in the bucket of the first week of the year
+        rollup = rollup.dropna(subset=["bucket"]).astype({"bucket": np.int64})
+        products, product_names = pd.factorize(data["product"])
+        bar_keys = product_names.get_indexer(rollup["product"]) * 1000000 + rollup["bucket"].to_numpy()
+        record_keys = products * 1000000 + to_bucket(data["date"], period)
+        covered = pd.Series(record_keys).isin(bar_keys).to_numpy()
+
+        # Only the uncovered records are assigned to their periods
+        edges = data[~covered]
+        edges = aggregate_period(add_period(edges.copy(), period), period, ["type", "product"])
+
+        bars = from_rollup(rollup, period)
+        bars = bars.set_index(period_group(["type", "product"], period))[["low", "high", "open", "close", "date"]]
+
+        if bars.empty or edges.empty:
+            return edges if bars.empty else bars.sort_index()
+
+        return pd.concat([bars, edges]).sort_index()
+
     def _relative_change(self, data: pd.DataFrame) -> dict:
         """
         Calculates the mean daily relative change in a period of time
@@ -172,43 +307,39 @@ class MetricsCalculator:
             dict
                 A nested dictionary of the calculation results
         """
-        # Marks the days of upward prices as 1s and the others as 0s
-        grouped_data = data.groupby(["product"])["close"]
-        up_down = grouped_data.rolling(2).apply(
-            lambda s: 1 if (s.tail(1).values - s.head(1).values) > 0 else 0
-        )
+        # Marks the days of upward and non-upward prices, the first record of every product has no previous
+        # price to be compared with, so its difference is NaN and is counted as neither
+        price_diff = data.groupby(["product"])["close"].diff()
+        counts = \
+            data.assign(up=(price_diff > 0), down=(price_diff <= 0)) \
+                .groupby(["product"])[["up", "down"]] \
+                .sum()
 
-        # Calculates the ratio
+        # Calculates the ratio, only where the denominator is greater than 0
+        denominator = (counts["down"] - 1).abs()
         updown_ratio = \
-            up_down.groupby(["product"]) \
-                .apply(
-                    lambda s:
-                        (s.where(s == 1).count() / abs(s.where(s == 0).count() - 1))
-                        # Only perform calculation if the denominator is greater than 0
-                        if  abs(s.where(s == 0).count() - 1) > 0 else 0
-                ).fillna(value=0) \
+            (counts["up"] / denominator.where(denominator > 0)) \
+                .fillna(value=0) \
                 .round(decimals=2) \
                 .to_dict()
         return updown_ratio
 
-    def _log_return(self, data: pd.DataFrame) -> dict:
+    def _log_return(self, data: pd.DataFrame) -> pd.Series:
         """
-        Calculates the daily logarithmic return rates
+        Intermediary method. Calculates the daily logarithmic return rates and stores them in the log_ror column of
+        the dataset, so that every return-based metric calculated on the same dataset shares a single computation
         Parameters:
             data: pd.DataFrame
                 A dataset where its records are associated with appropriate asset classes, products, and time periods
         Returns:
-            dict
-                A nested dictionary of the calculation results
+            pd.Series
+                The logarithmic return rates, the first record of every product has none and is left as NaN
         """
-        log_ror = \
-            data.groupby(["product"])["close"] \
-                .rolling(window=2) \
-                .apply(
-                    lambda s: np.log(s.tail(1).values / s.head(1).values)
-                ).reset_index() \
-                .rename(columns={"level_1": "index", "close": "log_ror"})
-        return log_ror
+        if "log_ror" not in data.columns:
+            previous_close = data.groupby(["product"])["close"].shift(1)
+            data["log_ror"] = np.log(data["close"] / previous_close)
+
+        return data["log_ror"]
 
     def _volatility(self, data: pd.DataFrame) -> dict:
         """
@@ -221,11 +352,9 @@ class MetricsCalculator:
             dict
                 A nested dictionary of the calculation results
         """
-        log_ror = self._log_return(data)
-        data = pd.merge(log_ror, data.reset_index(), on=["product", "index"])
+        self._log_return(data)
         volatility = \
-            data.groupby(["product"])["log_ror"] \
-                .apply(lambda x: x.std() * np.sqrt(252)) \
+            (data.groupby(["product"])["log_ror"].std() * np.sqrt(252)) \
                 .fillna(value=0) \
                 .round(decimals=2) \
                 .to_dict()
@@ -241,34 +370,32 @@ class MetricsCalculator:
             dict
                 A nested dictionary of the calculation results
         """
-        log_ror = self._log_return(data)
-        data = pd.merge(log_ror, data.reset_index(), on=["product", "index"])
+        self._log_return(data)
         expected_return = \
-            data.groupby(["product"])["log_ror"] \
-                .apply(lambda x: x.mean() * 252) \
+            (data.groupby(["product"])["log_ror"].mean() * 252) \
                 .fillna(value=0) \
                 .round(decimals=2) \
                 .to_dict()
         return expected_return
 
-    def calc(self, metrics: list, periods: list) -> list:
+    def calc_plan(self, plan: list) -> list:
         """
-        Intermediary method. Calculates a set of metrics based on a set of time periods.
+        Intermediary method. Calculates a set of (metric, period) pairs. The pairs are grouped by period beforehand,
+        so that the dataset of every period is transformed only once and shared by all the metrics of that period.
         Parameters:
-            metrics: list
-                The list of metrics to be calculated
-            periods: list
-                The time periods in which metrics are to be calculated
+            plan: list
+                The list of (metric, period) tuples to be calculated
         Returns:
             list
-                A list of nested dictionaries, each of which represents the calculation result according to a metric
+                A list of nested dictionaries, each of which represents the calculation results of a period
         """
-        metrics_dict = self._validate_metrics(metrics)
+        metrics_dict = self._validate_metrics([measurement for measurement, _ in plan])
         results = list()
-        for period in periods:
+        for period, metrics in plan_by_period(plan).items():
             data = self._transform_data_period(period)
 
-            # Calculates and stores the results in a dictionary
+            # Calculates and stores the results in a dictionary, all metrics of a period share the same dataset
+            # and hence the intermediate columns (e.g. log_ror) derived from it
             calculations = dict()
             for measurement in metrics:
                 calculations.update({
@@ -277,3 +404,19 @@ class MetricsCalculator:
             results.append({period: calculations})
 
         return results
+
+    def calc(self, metrics: list, periods: list) -> list:
+        """
+        Intermediary method. Calculates a set of metrics based on a set of time periods.
+        Parameters:
+            metrics: list
+                The list of metrics to be calculated
+            periods: list
+                The time periods in which metrics are to be calculated
+        Returns:
+            list
+                A list of nested dictionaries, each of which represents the calculation result according to a metric
+        """
+        self._validate_metrics(metrics)
+
+        return self.calc_plan([(measurement, period) for period in periods for measurement in metrics])
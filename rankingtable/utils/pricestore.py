@@ -0,0 +1,185 @@
+from threading import Lock
+import numpy as np
+import pandas as pd
+
+
+def to_days(dates) -> np.ndarray:
+    """
+    Transforms dates into the number of days since epoch
+    """
+    return pd.to_datetime(dates, yearfirst=True).values.astype("datetime64[D]").astype(np.int64)
+
+
+class PriceStore:
+    """
+    Provides a process-wide, columnar in-memory copy of the price records in DB. Records of the same product are
+    stored contiguously and sorted by date, so that a date range of any product is a slice of the arrays.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.loaded = False
+        self.last_id = 0
+
+        # Product attributes, one element for every product
+        self.product_ids = np.empty(0, dtype=np.int64)
+        self.types = np.empty(0, dtype=object)
+        self.names = np.empty(0, dtype=object)
+        self.symbols = np.empty(0, dtype=object)
+
+        # Records of the product at position p lie within offsets[p] and offsets[p + 1]
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.dates = np.empty(0, dtype=np.int64)
+        self.open = np.empty(0, dtype=np.float64)
+        self.high = np.empty(0, dtype=np.float64)
+        self.low = np.empty(0, dtype=np.float64)
+        self.close = np.empty(0, dtype=np.float64)
+
+        # Maps product symbols and asset classes to product positions
+        self.index_by_symbol = dict()
+        self.index_by_assetclass = dict()
+
+    def _add_products(self, records: pd.DataFrame) -> None:
+        """
+        Registers the products of new records that are not yet in the store
+        Parameters:
+            records: pd.DataFrame
+                New records, along with the attributes of their products
+        Returns:
+            None
+                Directly affects the store
+        """
+        products = records.drop_duplicates(subset=["product_id"])
+        products = products[~products["product_id"].isin(self.product_ids)]
+        if products.empty:
+            return None
+
+        first_position = len(self.product_ids)
+        self.product_ids = np.concatenate([self.product_ids, products["product_id"].to_numpy(dtype=np.int64)])
+        self.types = np.concatenate([self.types, products["type"].to_numpy(dtype=object)])
+        self.names = np.concatenate([self.names, products["product"].to_numpy(dtype=object)])
+        self.symbols = np.concatenate([self.symbols, products["symbol"].to_numpy(dtype=object)])
+        self.offsets = np.concatenate([self.offsets, np.repeat(self.offsets[-1], len(products))])
+
+        for position, (asset_class, symbol) in enumerate(zip(products["type"], products["symbol"]), first_position):
+            self.index_by_symbol[symbol] = position
+            self.index_by_assetclass.setdefault(asset_class, list()).append(position)
+
+    def _append(self, records: list) -> None:
+        """
+        Merges new records into the arrays, keeping records of the same product contiguous and sorted by date
+        Parameters:
+            records: list
+                A list containing tuples of new data records, as fetched by DataReader.fetch_new_price_records
+        Returns:
+            None
+                Directly affects the store
+        """
+        records = pd.DataFrame.from_records(
+            records,
+            columns=["id", "product_id", "type", "product", "symbol", "date", "open", "high", "low", "close"]
+        )
+        self._add_products(records)
+
+        # Only the new records are sorted, by product position and date, each of them is then inserted after the
+        # existing records of its product that are dated on or before it
+        positions = pd.Series(np.arange(len(self.product_ids)), index=self.product_ids)
+        new_positions = positions.loc[records["product_id"]].to_numpy()
+        new_dates = to_days(records["date"])
+        order = np.lexsort((new_dates, new_positions))
+        new_positions, new_dates = new_positions[order], new_dates[order]
+
+        insertions = np.empty(len(order), dtype=np.int64)
+        bounds = np.flatnonzero(np.diff(new_positions, prepend=-1, append=-1))
+        for lower, upper in zip(bounds[:-1], bounds[1:]):
+            start, end = self.offsets[new_positions[lower]], self.offsets[new_positions[lower] + 1]
+            insertions[lower:upper] = \
+                start + np.searchsorted(self.dates[start:end], new_dates[lower:upper], side="right")
+
+        self.dates = np.insert(self.dates, insertions, new_dates)
+        for column in ["open", "high", "low", "close"]:
+            values = records[column].to_numpy(dtype=np.float64)[order]
+            setattr(self, column, np.insert(getattr(self, column), insertions, values))
+        new_counts = np.bincount(new_positions, minlength=len(self.product_ids))
+        self.offsets = self.offsets + np.concatenate([[0], np.cumsum(new_counts)])
+        self.last_id = int(records["id"].max())
+
+    def refresh(self, reader) -> None:
+        """
+        Loads the price records that are newer than those in the store, or all of them on the first call. New records
+        are detected by their ids, which only grow as records are inserted, so records that are backfilled with older
+        dates are loaded as well, but records that are updated or deleted in place, e.g. by a migration, are not
+        reflected until the process is restarted
+        Parameters:
+            reader: DataReader
+                The reader through which price records are fetched from DB
+        Returns:
+            None
+                Directly affects the store
+        """
+        with self._lock:
+            if self.loaded and reader.fetch_last_price_id() <= self.last_id:
+                return None
+
+            records = reader.fetch_new_price_records(self.last_id)
+            if records:
+                self._append(records)
+            self.loaded = True
+
+    def fetch(self, reader, start_date: str, end_date: str, by="", arg="") -> pd.DataFrame:
+        """
+        Gets price records by slicing the arrays of the products being requested
+        Parameters:
+            reader: DataReader
+                The reader through which new price records, if any, are fetched from DB beforehand
+            start_date: str
+                The date from which price records are to be fetched
+            end_date: str
+                The date to which price records are to be fetched
+            by: str
+                The identifier of which group of price records should be fetched
+            arg: str or list
+                The value of the identifier, a list of symbols if records of multiple products are fetched
+        Returns:
+            pd.DataFrame
+                A DataFrame containing the price records along with the asset classes and products they belong to
+        """
+        self.refresh(reader)
+
+        with self._lock:
+            if by == "asset class":
+                positions = self.index_by_assetclass.get(arg, list())
+            elif by == "product":
+                positions = [self.index_by_symbol[arg]] if arg in self.index_by_symbol else list()
+            elif by == "products":
+                positions = [self.index_by_symbol[symbol] for symbol in arg if symbol in self.index_by_symbol]
+            else:
+                positions = range(len(self.product_ids))
+            positions = np.asarray(positions, dtype=np.int64)
+
+            # Finds the slice of every product that lies within the date range
+            start_day, end_day = to_days([start_date, end_date])
+            starts = np.empty(len(positions), dtype=np.int64)
+            ends = np.empty(len(positions), dtype=np.int64)
+            for i, position in enumerate(positions):
+                lower, upper = self.offsets[position], self.offsets[position + 1]
+                starts[i] = lower + np.searchsorted(self.dates[lower:upper], start_day, side="left")
+                ends[i] = lower + np.searchsorted(self.dates[lower:upper], end_day, side="right")
+
+            # Concatenates the slices into a single array of indices
+            counts = ends - starts
+            index = np.repeat(starts - (counts.cumsum() - counts), counts) + np.arange(counts.sum())
+
+            return pd.DataFrame({
+                "type": np.repeat(self.types[positions], counts),
+                "product": np.repeat(self.names[positions], counts),
+                "symbol": np.repeat(self.symbols[positions], counts),
+                "date": self.dates[index].astype("datetime64[D]"),
+                "open": self.open[index],
+                "high": self.high[index],
+                "low": self.low[index],
+                "close": self.close[index],
+            })
+
+
+# The store shared by every request served by the process
+price_store = PriceStore()
@@ -0,0 +1,235 @@
+from rankingtable.utils.dboperator import DbController
+
+import sqlite3
+import pandas as pd
+
+
+# The format in which the times of update jobs are stored in DB, every time is in UTC
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_utc(now=None) -> pd.Timestamp:
+    """
+    Utility function: Gets the given time in UTC, the current time if none is given
+    """
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    return now.tz_localize("UTC") if now.tzinfo is None else now.tz_convert("UTC")
+
+
+class UpdateScheduler:
+    """
+    Schedules an incremental update job for every product that is behind its market, i.e. whose next session has
+    closed, and runs the jobs that are due. Jobs are persisted in DB, so that those interrupted by a crash are resumed
+    and no product is queued twice; a job is claimed by a single UPDATE, so concurrent schedulers never run the same
+    job, and its new records are inserted straight into DB, so nothing ever waits on a full refresh.
+    """
+    def __init__(self, connection: sqlite3.Connection, BASE_DIR: str, downloader=None, calendars=None,
+                 archive=True, delay=1800, max_attempts=3, retry_delay=900, history_days=30):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.controller = DbController(connection, calendars)
+        self.calendars = self.controller.calendars
+        self.BASE_DIR = BASE_DIR
+        self.downloader = downloader
+        self.archive = archive
+
+        # The time in seconds that a job waits after the close of a session, so that the source has published
+        # its records, the number of attempts of a job, the time between them, and how long finished jobs are kept
+        self.delay = pd.to_timedelta(delay, unit="s")
+        self.max_attempts = max_attempts
+        self.retry_delay = pd.to_timedelta(retry_delay, unit="s")
+        self.history = pd.to_timedelta(history_days, unit="d")
+
+    def recover(self) -> int:
+        """
+        Requeues the jobs left running by a scheduler that has crashed, it must only be called while
+        no other scheduler is running
+        Returns:
+            int
+                The number of requeued jobs
+        """
+        with self.connection:
+            self.cursor.execute("UPDATE rankingtable_updatejob SET status = 'pending' WHERE status = 'running'")
+            return self.cursor.rowcount
+
+    def schedule(self, now=None) -> int:
+        """
+        Queues a job for every product that is behind its market and does not have an active job yet
+        Parameters:
+            now: Timestamp
+                The current time, defaults to the current time in UTC
+        Returns:
+            int
+                The number of new jobs
+        """
+        now = to_utc(now)
+        # The end date of the downloads of the jobs, see run_pending
+        today = now.date()
+
+        latest_dates = self.cursor.execute("""
+            SELECT product.id, assetclass.name, latest.date
+            FROM
+                rankingtable_assetclass AS assetclass
+                JOIN rankingtable_product AS product
+                JOIN rankingtable_productlatest AS latest
+            ON
+                assetclass.id = product.assetclass_id
+                AND latest.product_id = product.id
+        """).fetchall()
+
+        jobs = list()
+        for product_id, asset_class, latest_date in latest_dates:
+            calendar = self.calendars.get(asset_class)
+            if calendar.is_up_to_date(latest_date, before=today, now=now):
+                continue
+            # A job is due some time after the close of the session it is meant to download
+            closed_at = calendar.last_close(before=today, now=now)
+            scheduled_at = max(closed_at + self.delay, now)
+            jobs.append((product_id, closed_at.strftime(TIME_FORMAT), scheduled_at.strftime(TIME_FORMAT)))
+
+        with self.connection:
+            # Drop the finished jobs that are no longer worth keeping
+            self.cursor.execute(
+                "DELETE FROM rankingtable_updatejob WHERE status IN ('done', 'failed') AND finished_at < ?",
+                ((now - self.history).strftime(TIME_FORMAT), )
+            )
+            # Products that already have a pending or running job are skipped by the partial unique index, and
+            # those whose job has run out of attempts are only retried once the next session has closed
+            count = self.connection.total_changes
+            self.cursor.executemany("""
+                INSERT INTO rankingtable_updatejob (status, attempts, scheduled_at, product_id)
+                SELECT 'pending', 0, :scheduled_at, :product_id
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM rankingtable_updatejob
+                    WHERE product_id = :product_id AND status = 'failed' AND finished_at >= :closed_at
+                )
+                ON CONFLICT (product_id) WHERE status IN ('pending', 'running') DO NOTHING
+            """, [
+                {"product_id": product_id, "closed_at": closed_at, "scheduled_at": scheduled_at}
+                for product_id, closed_at, scheduled_at in jobs
+            ])
+            return self.connection.total_changes - count
+
+    def _claim_jobs(self, now: pd.Timestamp) -> list:
+        """
+        Marks every due job as running
+        Returns:
+            list
+                A list containing tuples of the id, product id and attempts of the claimed jobs
+        """
+        with self.connection:
+            return self.cursor.execute("""
+                UPDATE rankingtable_updatejob
+                SET status = 'running', started_at = ?, attempts = attempts + 1
+                WHERE status = 'pending' AND scheduled_at <= ?
+                RETURNING id, product_id, attempts
+            """, (now.strftime(TIME_FORMAT), now.strftime(TIME_FORMAT))).fetchall()
+
+    def _finish_jobs(self, jobs: list, now: pd.Timestamp) -> None:
+        """
+        Marks the claimed jobs as done, or requeues those that have failed until they run out of attempts
+        Parameters:
+            jobs: list
+                A list containing tuples of the id, attempts and error of the jobs
+        """
+        records = list()
+        for job_id, attempts, error in jobs:
+            if error is None:
+                status, scheduled_at = "done", None
+            elif attempts < self.max_attempts:
+                status, scheduled_at = "pending", (now + self.retry_delay * 2 ** (attempts - 1)).strftime(TIME_FORMAT)
+            else:
+                status, scheduled_at = "failed", None
+            finished_at = now.strftime(TIME_FORMAT) if status != "pending" else None
+            records.append((status, error, finished_at, scheduled_at, job_id))
+
+        with self.connection:
+            self.cursor.executemany("""
+                UPDATE rankingtable_updatejob
+                SET status = ?, error = ?, finished_at = ?, scheduled_at = COALESCE(?, scheduled_at)
+                WHERE id = ?
+            """, records)
+
+    def run_pending(self, now=None) -> dict:
+        """
+        Runs every job that is due, the new price records of their products are downloaded concurrently
+        and inserted straight into DB
+        Parameters:
+            now: Timestamp
+                The current time, defaults to the current time in UTC
+        Returns:
+            dict
+                The status of the job of every product that has been processed, keyed by its symbol
+        """
+        now = to_utc(now)
+        today = now.date()
+        jobs = self._claim_jobs(now)
+        if not jobs:
+            return dict()
+
+        product_ids = [product_id for _, product_id, _ in jobs]
+        date_records = self.cursor.execute(f"""
+            SELECT assetclass.name, product.symbol, product.alias, latest.date, product.id
+            FROM
+                rankingtable_assetclass AS assetclass
+                JOIN rankingtable_product AS product
+                JOIN rankingtable_productlatest AS latest
+            ON
+                assetclass.id = product.assetclass_id
+                AND latest.product_id = product.id
+            WHERE product.id IN ({", ".join("?" * len(product_ids))})
+        """, product_ids).fetchall()
+        symbols = {record[-1]: record[1] for record in date_records}
+
+        try:
+            errors = self.controller.update_products(
+                [record[:-1] for record in date_records], self.BASE_DIR, self.downloader,
+                direct=True, archive=self.archive, end_date=today
+            )
+        except Exception as exception:
+            # The records of the failed update have been rolled back, every job is retried
+            errors = {symbol: repr(exception) for symbol in symbols.values()}
+
+        # A product that is still behind, e.g. because the source has not published the records of its last session
+        # yet, is retried like a failed download, instead of being marked done and queued again by every schedule
+        latest_dates = dict(self.cursor.execute(f"""
+            SELECT product_id, date FROM rankingtable_productlatest
+            WHERE product_id IN ({", ".join("?" * len(product_ids))})
+        """, product_ids).fetchall())
+        for asset_class, symbol, _, _, product_id in date_records:
+            calendar = self.calendars.get(asset_class)
+            if errors.get(symbol) is None \
+                    and not calendar.is_up_to_date(latest_dates[product_id], before=today, now=now):
+                errors[symbol] = "No new records"
+
+        self._finish_jobs(
+            [(job_id, attempts, errors.get(symbols.get(product_id))) for job_id, product_id, attempts in jobs],
+            now
+        )
+
+        return {
+            symbols[product_id]: errors.get(symbols[product_id]) or "done"
+            for _, product_id, _ in jobs if product_id in symbols
+        }
+
+    def next_wakeup(self, now=None) -> pd.Timestamp:
+        """
+        Gets the time at which there is next something to do, i.e. a pending job is due or a market closes
+        Parameters:
+            now: Timestamp
+                The current time, defaults to the current time in UTC
+        Returns:
+            pd.Timestamp
+                The time in UTC
+        """
+        now = to_utc(now)
+        asset_classes = [name for name, in self.cursor.execute("SELECT name FROM rankingtable_assetclass")]
+        wakeups = [self.calendars.get(asset_class).next_close(now) + self.delay for asset_class in asset_classes]
+
+        scheduled_at, = self.cursor.execute(
+            "SELECT MIN(scheduled_at) FROM rankingtable_updatejob WHERE status = 'pending'"
+        ).fetchone()
+        if scheduled_at is not None:
+            wakeups.append(max(to_utc(scheduled_at), now))
+
+        return min(wakeups) if wakeups else now + pd.to_timedelta(1, unit="d")
@@ -0,0 +1,159 @@
+from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr, \
+    USPresidentsDay, USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+from threading import Lock
+import pandas as pd
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """
+    The regular holidays of the New York Stock Exchange
+    """
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        Holiday("Martin Luther King Jr. Day", month=1, day=1, offset=USMartinLutherKingJr.offset,
+                start_date="1998-01-01"),
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+# Days on which the New York Stock Exchange was closed apart from its regular holidays
+NYSE_SPECIAL_CLOSURES = [
+    "2001-09-11", "2001-09-12", "2001-09-13", "2001-09-14",
+    "2004-06-11", "2007-01-02", "2012-10-29", "2012-10-30", "2018-12-05", "2025-01-09",
+]
+
+# The days of the week, the holidays and the time (in a timezone) at which the sessions of every kind of calendar
+# close, the sessions of the 24/7 calendar are days in UTC, which close at midnight
+CALENDARS = {
+    "NYSE": {
+        "weekmask": "1111100",
+        "holidays": lambda start, end: list(NYSEHolidayCalendar().holidays(start, end)) + NYSE_SPECIAL_CLOSURES,
+        "close": "16:00",
+        "timezone": "America/New_York",
+    },
+    "24/5": {"weekmask": "1111100", "holidays": None, "close": "17:00", "timezone": "America/New_York"},
+    "24/7": {"weekmask": "1111111", "holidays": None, "close": "24:00", "timezone": "UTC"},
+}
+
+# The calendar of every asset class, asset classes that are not listed follow the default calendar
+ASSET_CLASS_CALENDARS = {
+    "Cryptocurrency": "24/7",
+    "Currency": "24/5",
+}
+DEFAULT_CALENDAR = "NYSE"
+
+
+class TradingCalendar:
+    """
+    Provides a precomputed table of the trading sessions of a calendar within a date range, along with the times at
+    which they close, so that the last closed session can be looked up by a binary search
+    """
+    def __init__(self, name: str, start_date="1990-01-01", end_date="2100-12-31"):
+        definition = CALENDARS[name]
+        holidays = definition["holidays"](start_date, end_date) if definition["holidays"] else list()
+
+        self.name = name
+        self.sessions = pd.bdate_range(
+            start_date, end_date, freq="C", weekmask=definition["weekmask"], holidays=holidays
+        )
+        hours, minutes = map(int, definition["close"].split(":"))
+        self.closes = \
+            (self.sessions + pd.to_timedelta(hours, unit="h") + pd.to_timedelta(minutes, unit="min")) \
+                .tz_localize(definition["timezone"]).tz_convert("UTC")
+
+    def _to_now(self, now=None) -> pd.Timestamp:
+        """
+        Gets the given time in UTC, the current time if none is given
+        """
+        now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+        return now.tz_localize("UTC") if now.tzinfo is None else now
+
+    def _last_closed_position(self, before=None, now=None) -> int:
+        """
+        Gets the position of the last session that has closed by now in the session table
+        """
+        position = self.closes.searchsorted(self._to_now(now), side="right")
+        if before is not None:
+            position = min(position, self.sessions.searchsorted(pd.Timestamp(before), side="left"))
+
+        return position - 1
+
+    def last_closed_session(self, before=None, now=None) -> pd.Timestamp:
+        """
+        Gets the last session that has closed by now
+        Parameters:
+            before: date
+                If specified, only sessions dated before it are considered, e.g. the exclusive end date of a download
+            now: Timestamp
+                The current time, defaults to the current time in UTC
+        Returns:
+            pd.Timestamp
+                The date of the session
+        """
+        return self.sessions[self._last_closed_position(before, now)]
+
+    def last_close(self, before=None, now=None) -> pd.Timestamp:
+        """
+        Gets the time in UTC at which the last session that has closed by now closed, see last_closed_session
+        """
+        return self.closes[self._last_closed_position(before, now)]
+
+    def next_close(self, now=None) -> pd.Timestamp:
+        """
+        Gets the time in UTC at which the next session closes
+        Parameters:
+            now: Timestamp
+                The current time, defaults to the current time in UTC
+        Returns:
+            pd.Timestamp
+                The close time of the session
+        """
+        return self.closes[self.closes.searchsorted(self._to_now(now), side="right")]
+
+    def is_up_to_date(self, last_date, before=None, now=None) -> bool:
+        """
+        Checks whether records up to a date are up to date, i.e. the session that follows the date has not closed yet
+        Parameters:
+            last_date: date
+                The date of the last record
+            before: date
+                The same as that in last_closed_session method
+            now: Timestamp
+                The same as that in last_closed_session method
+        Returns:
+            bool
+                True if the records are up to date, False otherwise
+        """
+        return pd.Timestamp(last_date).tz_localize(None).normalize() >= self.last_closed_session(before, now)
+
+
+class TradingCalendars:
+    """
+    Maps every asset class to its trading calendar, calendars are only precomputed once they are first used
+    """
+    def __init__(self, asset_classes=None, default=DEFAULT_CALENDAR):
+        self._lock = Lock()
+        self.asset_classes = ASSET_CLASS_CALENDARS if asset_classes is None else asset_classes
+        self.default = default
+        self.calendars = dict()
+
+    def get(self, asset_class: str) -> TradingCalendar:
+        """
+        Gets the trading calendar of an asset class
+        """
+        name = self.asset_classes.get(asset_class, self.default)
+        with self._lock:
+            if name not in self.calendars:
+                self.calendars[name] = TradingCalendar(name)
+            return self.calendars[name]
+
+
+# The calendars shared by the whole process
+trading_calendars = TradingCalendars()
@@ -1,21 +1,43 @@
-import sqlite3
 from rankingtable.utils.dboperator import DbController
-from datetime import date, timedelta
+from rankingtable.utils.connection import get_connection_manager
+from datetime import date
 
 
 # Config variable
 BASE_DIR = ".\\"
 
-def update() -> None:
+def update(direct=False, archive=True) -> None:
     """
-    Explicitly update CSV files and DB with the most recent records
+    Explicitly update CSV files and DB with the most recent records, in direct mode the downloaded records are
+    inserted straight into DB and only appended to CSV files if archive is True
     """
-    with sqlite3.connect(BASE_DIR + "db.sqlite3") as connection:
+    with get_connection_manager(BASE_DIR + "db.sqlite3").writer() as connection:
         cursor = connection.cursor()
 
-        # Check if DB is up to date
-        latest_date_db = cursor.execute("SELECT MAX(date) FROM rankingtable_pricerecord").fetchone()[0]
-        yesterday = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
-        if not latest_date_db == yesterday:
-            controller = DbController(connection)
-            controller.update_db("yfinance", BASE_DIR + "Data\\Price")
+        # Check if DB is up to date, i.e. the next session of the least recently updated product
+        # of every asset class has not closed yet
+        controller = DbController(connection)
+        latest_dates = cursor.execute("""
+            SELECT assetclass.name, MIN(latest.date)
+            FROM
+                rankingtable_assetclass AS assetclass
+                JOIN rankingtable_product AS product
+                JOIN rankingtable_productlatest AS latest
+            ON
+                assetclass.id = product.assetclass_id
+                AND latest.product_id = product.id
+            GROUP BY assetclass.name
+        """).fetchall()
+        today = date.today()
+        if not all(controller.calendars.get(asset_class).is_up_to_date(latest_date, before=today)
+                   for asset_class, latest_date in latest_dates):
+            controller.update_db("yfinance", BASE_DIR + "Data\\Price", direct=direct, archive=archive)
+
+
+def rebuild() -> None:
+    """
+    Explicitly rebuild DB from all the records stored in CSV files, using the bulk load mode
+    """
+    with get_connection_manager(BASE_DIR + "db.sqlite3").writer() as connection:
+        controller = DbController(connection)
+        controller.batch_insert(BASE_DIR + "Data\\Price", bulk=True)
@@ -1,12 +1,13 @@
 from rankingtable.utils.metrics import MetricsCalculator
 from rankingtable.utils.dboperator import DbController
+from rankingtable.utils.cache import MetricsCache
+from rankingtable.utils.connection import get_connection_manager
 
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 import json
-import sqlite3
 import pandas as pd
 from datetime import date, datetime, timedelta
 
@@ -21,6 +22,13 @@ END_DATE = date.today().strftime("%Y-%m-%d")
 METRICS = config["metrics"]
 PERIODS = config["periods"]
 
+# Calculation results are cached until new records are inserted into DB, an empty
+# directory disables the on-disk cache shared by worker processes
+metrics_cache = MetricsCache(config["cache"]["max_entries"], config["cache"]["directory"])
+
+# Every thread keeps its read connection to DB alive across requests
+connections = get_connection_manager(DB_DIR)
+
 def add_period(period, column_head):
     """
     Utilility function: Appends a period to the front of a column header
@@ -37,8 +45,10 @@ def merge_dicts(records: pd.DataFrame, metrics: list) -> list:
             dictionary[key] = pd.DataFrame.from_records(value)
 
             # Special case when relative_change is calculated on multiple periods
-            if "relative_change" in dictionary[key].columns:
-                dictionary[key].columns = [add_period(key, column) for column in dictionary[key].columns]
+            dictionary[key].columns = [
+                add_period(key, column) if column == "relative_change" else column
+                for column in dictionary[key].columns
+            ]
 
             # Reset index and merges with the records DataFrame
             dictionary[key] = dictionary[key].reset_index(names=["product"])
@@ -47,7 +57,7 @@ def merge_dicts(records: pd.DataFrame, metrics: list) -> list:
     return records.to_dict(orient="records")
 
 
-def add_graphing_data(response: dict, start_date: str, end_date: str) -> dict:
+def add_graphing_data(controller: DbController, response: dict, start_date: str, end_date: str) -> dict:
     """
     Retrieves and adds data points (used for graphing purpose) of products given in the response to itself
     """
@@ -55,24 +65,22 @@ def add_graphing_data(response: dict, start_date: str, end_date: str) -> dict:
     if (date_range[1] - date_range[0]).days >= 30:
         start_date = (date_range[1] - pd.to_timedelta(30, unit="D")).strftime("%Y-%m-%d")
 
-    with sqlite3.connect(DB_DIR) as connection:
-        controller = DbController(connection)
-        for dictionary in response:
-            graphing_data = \
-                controller.fetch_records(
-                    "price record", start_date, end_date,
-                    "product", dictionary.get("symbol")
-                )
-            graphing_data = \
-                pd.DataFrame.from_records(
-                    graphing_data, exclude=[0, 1, 2, 4, 5, 6]
-                ).rename(columns={3: "time", 7: "value"}) \
-                .drop_duplicates(subset=["time"]) \
-                .to_dict(orient="records")
+    # Fetches the data points of all products at once, then splits them by product
+    symbols = [dictionary.get("symbol") for dictionary in response]
+    graphing_data = controller.fetch_records("price record", start_date, end_date, "products", symbols)
+    graphing_data = \
+        graphing_data[["symbol", "date", "close"]] \
+            .assign(date=graphing_data["date"].dt.strftime("%Y-%m-%d")) \
+            .rename(columns={"date": "time", "close": "value"})
+    graphing_data = {
+        symbol: records[["time", "value"]].to_dict(orient="records")
+        for symbol, records in graphing_data.groupby("symbol", sort=False)
+    }
 
-            dictionary.update({"graphing_data": graphing_data})
+    for dictionary in response:
+        dictionary.update({"graphing_data": graphing_data.get(dictionary.get("symbol"), list())})
 
-        return response
+    return response
 
 
 def get_response(start_date: str, end_date: str, metrics: list, periods: list, by="", arg="") -> dict:
@@ -80,44 +88,80 @@ def get_response(start_date: str, end_date: str, metrics: list, periods: list, b
     Gets all price records in a given time range or price records of a specified asset class and
     derives statistics metrics from these records. Returns the final result as the reponse.
     """
-    with sqlite3.connect(DB_DIR) as connection:
+    with connections.reader() as connection:
         controller = DbController(connection)
         records = controller.fetch_records("price record", start_date, end_date, by, arg)
 
         # In case there are no records that match the specified arguments
-        if not records: return []
+        if records.empty: return []
+
+        # Retrieve the pre-aggregated bars of the weekly, monthly and yearly periods
+        rollups = dict()
+        for period in periods:
+            if period.lower() in ["w", "m", "y"]:
+                rollups[period] = pd.DataFrame.from_records(
+                    controller.fetch_records("price rollup", period.lower(), start_date, end_date, by, arg),
+                    columns=["type", "product", "bucket", "open", "high", "low", "close", "first_date", "date"]
+                )
 
         # Calculate required metrics
-        calculator = MetricsCalculator(
-            records, columns=["type", "product", "symbol", "date", "open", "high", "low", "close"]
+        calculator = MetricsCalculator(records, rollups=rollups)
+
+        # Plan all the required (metric, period) pairs so that each period is only transformed once, the
+        # user-specified metrics set might be empty and so might the periods
+        plan = [("relative_change", period) for period in periods] \
+               + [("absolute_change", "d")] \
+               + [(measurement, "d") for measurement in metrics]
+        metrics = calculator.calc_plan(plan)
+
+        # Retrieve latest records available, those dated after the end date are replaced
+        # by the last records in the date range
+        latest_records = pd.DataFrame.from_records(
+            controller.fetch_records("latest price", by, arg),
+            columns=["type", "product", "symbol", "date", "open", "high", "low", "close"]
         )
-
-        # Exclude the user-specified metrics set when it is empty
-        if metrics:
-            # Accept empty period
-            metrics = calculator.calc(["relative_change"], periods) \
-                      + calculator.calc(["absolute_change"], ["d"]) \
-                      + calculator.calc(metrics, ["d"])
-        else:
-            metrics = calculator.calc(["relative_change"], periods) \
-                      + calculator.calc(["absolute_change"], ["d"])
-
-        # Retrieve latest records available
-        latest_records = calculator.data.groupby(["type", "product"]).last().reset_index()
+        latest_records["date"] = pd.to_datetime(latest_records["date"], yearfirst=True)
+        latest_records = latest_records[
+            (latest_records["date"] <= pd.to_datetime(end_date, yearfirst=True))
+            & latest_records["product"].isin(calculator.data["product"])
+        ]
+        outdated_records = calculator.data[~calculator.data["product"].isin(latest_records["product"])]
+        if not outdated_records.empty:
+            outdated_records = \
+                outdated_records.groupby(["type", "product"])[latest_records.columns[2:]].last().reset_index()
+            latest_records = \
+                pd.concat([latest_records, outdated_records]) if not latest_records.empty else outdated_records
+        latest_records = latest_records.sort_values(by=["type", "product"]).reset_index(drop=True)
 
         # Merge the datasets into a single response of dictionary structure
         response = merge_dicts(latest_records, metrics)
-        response = add_graphing_data(response, start_date, end_date)
+        response = add_graphing_data(controller, response, start_date, end_date)
 
         return response
 
 
+def get_cached_response(start_date: str, end_date: str, metrics: list, periods: list, by="", arg="") -> dict:
+    """
+    Gets the response from the cache, or derives and caches it if there is none for the current version of data in DB
+    """
+    with connections.reader() as connection:
+        data_version = DbController(connection).fetch_records("data version")
+
+    key = (by, arg, start_date, end_date, tuple(metrics), tuple(periods))
+    response = metrics_cache.get(key, data_version)
+    if response is None:
+        response = get_response(start_date, end_date, metrics, periods, by, arg)
+        metrics_cache.set(key, data_version, response)
+
+    return response
+
+
 class Index(APIView):
     """
     Index Page
     """
     def get(self, request):
-        response = get_response(START_DATE, END_DATE, METRICS, PERIODS)
+        response = get_cached_response(START_DATE, END_DATE, METRICS, PERIODS)
         return Response(response, status=status.HTTP_200_OK)
 
     def post(self, request):
@@ -135,7 +179,7 @@ class AssetClass(APIView):
     """
     def get(self, request, **kwargs):
         response = \
-            get_response(
+            get_cached_response(
                 START_DATE, END_DATE, METRICS, PERIODS,
                 by="asset class", arg=self.kwargs["assetclass"]
             )